@@ -1,17 +1,34 @@
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.startup import timeline, BackgroundModel
 import tkinter as tk
 from tkinter import ttk, filedialog
 from PIL import ImageTk, Image
 import tensorflow as tf
-import cv2
-import imutils
+from preprocess import crop_img
+from common.executor import InferenceExecutor
+from common.models import load_runtime_model
+from common.instrument import Instrument
+from common.result_cache import ResultCache, model_identity
+timeline.mark("import")
 
 
 class App(tk.Tk):
     def __init__(self, title="window", window_size=(200, 200), icon=None):
         super().__init__()
         
-        self.model = tf.keras.models.load_model("brain_tumor_detector.h5",
-                                                compile=False)
+        self.model = None
+        self.model_loader = BackgroundModel(
+            lambda: load_runtime_model("brain_tumor"),
+            warmup=lambda model: model.predict(tf.zeros((1, 256, 256, 3)),
+                                               verbose=0))
+        self.result_cache = ResultCache(model_identity("brain_tumor"))
+        # F9 captures a tf.profiler trace of the next 10 detections
+        self.instrument = Instrument("brain_tumor")
+        self.bind("<F9>", self.on_profile)
+        self.executor = InferenceExecutor(self)
         
         self.image_path = None
         self.input_image = None
@@ -31,6 +48,8 @@ class App(tk.Tk):
         self.setup_window(title, window_size, icon=icon)
         self.layout_ui()
         self.id_to_cls_map = self.load_id_to_class()
+        timeline.mark("window")
+        self.model_loader.when_done(self, self.on_model_ready)
         
     def setup_window(self, title, size=None, icon=None):
         self.title(title)
@@ -85,6 +104,17 @@ class App(tk.Tk):
         self.prob_result = ttk.Label(self, text="", font=("Arial", 20))
         self.prob_result.pack_forget()
         
+        self.msg_label = ttk.Label(self, text="模型載入中...")
+        self.msg_label.pack()
+        self.convert_btn.state(["disabled"])
+
+    def on_model_ready(self, loader):
+        if loader.error is not None:
+            self.msg_label["text"] = f"模型載入失敗: {loader.error}"
+            return
+        self.model = loader.model
+        self.convert_btn.state(["!disabled"])
+        self.msg_label["text"] = "模型就緒"
         
     def load_id_to_class(self):
         id_to_cls = {}
@@ -100,8 +130,11 @@ class App(tk.Tk):
         img_path = filedialog.askopenfilename(filetypes=f_types)
 
         if img_path is not None and img_path != "":
+            # a detection still running for the previous image is stale now
+            self.executor.cancel_all()
             self.image_path = img_path
             with Image.open(self.image_path) as img:
+                img.draft("RGB", self.model_image_size)
                 img = img.resize(self.model_image_size)
                 self.input_image = ImageTk.PhotoImage(img)
                 self.file_path_label["text"] = self.image_path.split("/")[-1]
@@ -122,10 +155,31 @@ class App(tk.Tk):
             self.input_image_canvas.pack(after=self.open_image_btn)
     
             
+    def on_profile(self, event=None):
+        if self.instrument.profile(10):
+            self.msg_label["text"] = (f"Profiler 擷取接下來 10 次推論至 "
+                                      f"{self.instrument.profile_dir}")
+    
     def detect_tumor(self):
         if self.image_path is not None:
-            label, prob = self.tf_detect_tumor(self.image_path)
-            
+            image_path = self.image_path
+            # repeated clicks on the same image join the job already queued
+            self.executor.submit(
+                lambda: self.result_cache.get_or_compute(
+                    image_path, lambda: self.tf_tumor_probs(image_path)),
+                self.on_detected, key=image_path)
+            self.msg_label["text"] = f"偵測中... ({self.executor.summary()})"
+    
+    def on_detected(self, job):
+        if job.error is not None:
+            self.msg_label["text"] = f"偵測失敗: {job.error}"
+            return
+        probs, hit = job.result
+        with self.instrument.stage("postprocess"):
+            label = int(probs.argmax())
+            prob = probs[label]
+        
+        with self.instrument.stage("display"):
             name = self.id_to_cls_map[label]
             en_name = self.en_local[name]
             ch_name = self.ch_local[name]
@@ -141,56 +195,45 @@ class App(tk.Tk):
                 self.prob_result["foreground"] = "#008000"
                 
             self.prob_result.pack(after=self.result)
+        self.instrument.record("total", time.perf_counter() - job.submitted)
+        if not hit:
+            timeline.interval("first_inference", job.latency)
+        self.msg_label["text"] = (("使用快取結果" if hit else "偵測完成")
+                                  + f" (快取命中 {self.result_cache.hits}"
+                                  f" / 未命中 {self.result_cache.misses})"
+                                  + f"\n{self.instrument.summary()}"
+                                  + f"\n{self.executor.summary()}")
             
-    def tf_detect_tumor(self, img_path):
+    def tf_tumor_probs(self, img_path):
         input_data = self.get_input_data(img_path)
-        output = self.model.predict(input_data, verbose=0)
+        with self.instrument.stage("inference"):
+            output = self.model.predict(input_data, verbose=0)
+        
+        return output[0]
+    
+    def tf_detect_tumor(self, img_path):
+        output = self.tf_tumor_probs(img_path)[None]
         label = tf.argmax(output, axis=1)
         label = tf.squeeze(label, axis=0)   
         
         return label.numpy(), output[0][label]
     
     def get_input_data(self, img_path):
-        input_img = tf.io.read_file(img_path)
-        input_img = tf.io.decode_jpeg(input_img, 3)
-        input_img = self.crop_img(input_img.numpy(), 
-                                   image_size=self.model_image_size)
-        # input_img = tf.image.resize(input_img, self.model_image_size)
-        input_img = tf.cast(input_img, tf.float32)
-        input_img = tf.expand_dims(input_img, axis=0)
+        with self.instrument.stage("decode"):
+            input_img = tf.io.read_file(img_path)
+            input_img = tf.io.decode_jpeg(input_img, 3)
+            input_img = input_img.numpy()
+        with self.instrument.stage("preprocess"):
+            input_img = self.crop_img(input_img, 
+                                       image_size=self.model_image_size)
+            # input_img = tf.image.resize(input_img, self.model_image_size)
+            input_img = tf.cast(input_img, tf.float32)
+            input_img = tf.expand_dims(input_img, axis=0)
         
         return input_img
     
     def crop_img(self, img, image_size=(256, 256)):
-        """
-        Finds the extreme points on the image and crops the rectangular out of them
-        """
-        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-        gray = cv2.GaussianBlur(gray, (3, 3), 0)
-    
-        # threshold the image, then perform a series of erosions +
-        # dilations to remove any small regions of noise
-        thresh = cv2.threshold(gray, 45, 255, cv2.THRESH_BINARY)[1]
-        thresh = cv2.erode(thresh, None, iterations=2)
-        thresh = cv2.dilate(thresh, None, iterations=2)
-    
-        # find contours in thresholded image, then grab the largest one
-        cnts = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        cnts = imutils.grab_contours(cnts)
-        c = max(cnts, key=cv2.contourArea)
-    
-        # find the extreme points
-        extLeft = tuple(c[c[:, :, 0].argmin()][0])
-        extRight = tuple(c[c[:, :, 0].argmax()][0])
-        extTop = tuple(c[c[:, :, 1].argmin()][0])
-        extBot = tuple(c[c[:, :, 1].argmax()][0])
-        ADD_PIXELS = 0
-        new_img = img[extTop[1]-ADD_PIXELS:extBot[1]+ADD_PIXELS, extLeft[0]-ADD_PIXELS:extRight[0]+ADD_PIXELS].copy()
-        
-        # resize image
-        new_img = cv2.resize(new_img, image_size)
-        
-        return new_img
+        return crop_img(img, image_size=image_size)
  
 if __name__ == "__main__":              
     app = App(title="CNN腫瘤偵測", 
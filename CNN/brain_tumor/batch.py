@@ -0,0 +1,164 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from preprocess import crop_files
+
+IMAGE_EXTS = (".jpg", ".jpeg")
+
+
+def list_images(inputs):
+    """
+    Expands directories and glob patterns into a sorted, de-duplicated list
+    of jpeg paths
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, f) for f in sorted(files))
+        else:
+            paths.extend(sorted(glob.glob(item, recursive=True)))
+
+    seen = set()
+    images = []
+    for path in paths:
+        if path.lower().endswith(IMAGE_EXTS) and path not in seen:
+            seen.add(path)
+            images.append(path)
+    return images
+
+
+def load_id_to_class(path="id_to_class.txt"):
+    id_to_cls = {}
+    with open(path, "r") as f:
+        for line in f.readlines():
+            target, classname = line.replace("\n", "").split("\t")
+            id_to_cls[int(target)] = classname
+    return id_to_cls
+
+
+def make_dataset(paths, stats, image_size=(256, 256), batch_size=32,
+                 workers=None, cache_dir=None):
+    import tensorflow as tf
+
+    def generate():
+        for path, img, hit, error in crop_files(paths, image_size=image_size,
+                                                cache_dir=cache_dir,
+                                                workers=workers):
+            if error is not None:
+                # unreadable files or scans without a skull contour
+                stats["skipped"] += 1
+                print(f"Skipping {path}: {error}", file=sys.stderr)
+                continue
+            stats["cache_hits"] += int(hit)
+            yield path, img
+
+    signature = (tf.TensorSpec((), tf.string),
+                 tf.TensorSpec((image_size[1], image_size[0], 3), tf.uint8))
+    ds = tf.data.Dataset.from_generator(generate, output_signature=signature)
+    ds = ds.batch(batch_size)
+    ds = ds.prefetch(tf.data.AUTOTUNE)
+    return ds
+
+
+class ResultWriter:
+    def __init__(self, path, fmt=None):
+        if fmt is None:
+            fmt = "jsonl" if path.lower().endswith((".jsonl", ".json")) else "csv"
+        self.fmt = fmt
+        self.file = sys.stdout if path == "-" else open(path, "w", newline="",
+                                                         encoding="utf-8")
+        self.csv = None
+        if fmt == "csv":
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(["file", "class", "probability"])
+
+    def write(self, file, classname, prob):
+        if self.csv is not None:
+            self.csv.writerow([file, classname, f"{prob:.6f}"])
+        else:
+            self.file.write(json.dumps({"file": file,
+                                        "class": classname,
+                                        "probability": round(prob, 6)},
+                                       ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+def run(args):
+    # imported here, not at the top: spawned crop workers re-import this
+    # script and must not each load TensorFlow
+    import tensorflow as tf
+    from common.models import load_runtime_model
+
+    paths = list_images(args.inputs)
+    if not paths:
+        print("No images found", file=sys.stderr)
+        return 1
+
+    id_to_cls = load_id_to_class(args.labels)
+    model = load_runtime_model("brain_tumor", path=args.model)
+    stats = {"skipped": 0, "cache_hits": 0}
+    cache_dir = None if args.no_cache else args.cache_dir
+    ds = make_dataset(paths, stats, batch_size=args.batch_size,
+                      workers=args.workers, cache_dir=cache_dir)
+    writer = ResultWriter(args.output, args.format)
+
+    count = 0
+    start = time.perf_counter()
+    try:
+        for batch_paths, images in ds:
+            probs = model.predict_on_batch(tf.cast(images, tf.float32))
+            labels = probs.argmax(axis=1)
+            for path, label, prob in zip(batch_paths.numpy(), labels, probs):
+                writer.write(path.decode("utf-8"), id_to_cls[int(label)],
+                             float(prob[label]))
+            writer.flush()
+
+            count += len(labels)
+            elapsed = time.perf_counter() - start
+            print(f"{count}/{len(paths)} images, {count / elapsed:.1f} images/sec",
+                  file=sys.stderr)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Classified {count} images in {elapsed:.2f}s "
+          f"({count / elapsed:.1f} images/sec), "
+          f"{stats['cache_hits']} crop cache hits, skipped {stats['skipped']}",
+          file=sys.stderr)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch brain tumor detection")
+    parser.add_argument("inputs", nargs="+",
+                        help="image directories or glob patterns")
+    parser.add_argument("-o", "--output", default="results.csv",
+                        help="csv or jsonl output path, '-' for stdout")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                        help="output format, inferred from --output by default")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="crop worker processes, defaults to the cpu count")
+    parser.add_argument("--cache-dir", default="crop_cache",
+                        help="on-disk cache of cropped images")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--model", default="brain_tumor_detector.h5",
+                        help="keras model, MODEL_BACKEND selects tflite instead")
+    parser.add_argument("--labels", default="id_to_class.txt")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
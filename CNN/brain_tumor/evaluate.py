@@ -0,0 +1,275 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+import numpy as np
+import tensorflow as tf
+from batch import IMAGE_EXTS
+from preprocess import CROP_VERSION, crop_img
+from common.models import load_runtime_model
+
+# row states in the cache's .ok file
+PENDING, CROPPED, FAILED = 0, 1, 2
+
+
+def load_class_to_id(path="class_to_id.txt"):
+    cls_to_id = {}
+    with open(path, "r") as f:
+        for line in f.readlines():
+            classname, target = line.replace("\n", "").split("\t")
+            cls_to_id[classname] = int(target)
+    return cls_to_id
+
+
+def list_labelled(root, cls_to_id):
+    """
+    (path, label) for every jpeg under root/<class>/, in a stable order.
+    Folders that are not a class in class_to_id.txt are reported and skipped
+    """
+    paths, labels = [], []
+    for entry in sorted(os.listdir(root)):
+        class_dir = os.path.join(root, entry)
+        if not os.path.isdir(class_dir):
+            continue
+        if entry not in cls_to_id:
+            print(f"Skipping folder {entry}: not in class_to_id.txt",
+                  file=sys.stderr)
+            continue
+        for dirpath, _, files in os.walk(class_dir):
+            for f in sorted(files):
+                if f.lower().endswith(IMAGE_EXTS):
+                    paths.append(os.path.join(dirpath, f))
+                    labels.append(cls_to_id[entry])
+    return paths, labels
+
+
+class CropCache:
+    """
+    Cropped images of one cohort in a memory-mapped (N, H, W, 3) uint8 file,
+    with a per-row state file so an interrupted run resumes where it
+    stopped. The cohort is identified by every file's path, size and mtime,
+    so adding, removing or editing an image starts a new cache. Rows are
+    paged in and out by the OS, so memory does not grow with the cohort
+    """
+
+    def __init__(self, cache_dir, paths, image_size=(256, 256)):
+        digest = hashlib.sha1(
+            f"{image_size[0]}x{image_size[1]}:v{CROP_VERSION}".encode())
+        for path in paths:
+            st = os.stat(path)
+            digest.update(f"{os.path.abspath(path)}\0{st.st_size}\0"
+                          f"{st.st_mtime_ns}\n".encode())
+        key = digest.hexdigest()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, f"cohort_{key}.u8")
+        state_path = self.path[:-3] + ".ok"
+        shape = (len(paths), image_size[1], image_size[0], 3)
+
+        # rows are only trusted with their states, so a run interrupted
+        # between creating the two files starts both over
+        exists = os.path.exists(self.path) and os.path.exists(state_path)
+        mode = "r+" if exists else "w+"
+        self.images = np.memmap(self.path, np.uint8, mode, shape=shape)
+        self.state = np.memmap(state_path, np.uint8, mode,
+                               shape=(len(paths),))
+        self.hits = int(np.count_nonzero(self.state == CROPPED))
+
+    def flush(self):
+        self.images.flush()
+        self.state.flush()
+
+
+def make_dataset(paths, labels, image_size=(256, 256), batch_size=32,
+                 cache=None):
+    """
+    Streams (indices, images, labels) batches. Files not in the cache yet
+    are read and decoded with tf.io.decode_jpeg in one parallel map call
+    and skull-cropped in a second one, which also fills their cache rows.
+    Rows the cache already holds are read from it instead, and files an
+    earlier run failed on are left out. A file that fails to decode or crop
+    is dropped from the stream, so the caller finds the failures as the
+    indices it never received
+    """
+    shape = image_size[::-1] + (3,)
+    indices = np.arange(len(paths), dtype=np.int64)
+    labels = np.asarray(labels, np.int64)
+    paths = np.asarray(paths)
+    state = (np.asarray(cache.state) if cache is not None
+             else np.full(len(paths), PENDING, np.uint8))
+    cached = state == CROPPED
+    fresh = state == PENDING
+
+    def read_cached(index):
+        return np.asarray(cache.images[index])
+
+    def crop(index, img):
+        img = crop_img(img, image_size=image_size)
+        if cache is not None:
+            cache.images[index] = img
+        return img
+
+    def with_shape(index, img, label):
+        img.set_shape(shape)
+        return index, img, label
+
+    cached_ds = tf.data.Dataset.from_tensor_slices((indices[cached],
+                                                    labels[cached]))
+    cached_ds = cached_ds.map(
+        lambda index, label: with_shape(
+            index, tf.numpy_function(read_cached, [index], tf.uint8), label),
+        num_parallel_calls=tf.data.AUTOTUNE, deterministic=False)
+
+    fresh_ds = tf.data.Dataset.from_tensor_slices((indices[fresh], paths[fresh],
+                                                   labels[fresh]))
+    fresh_ds = fresh_ds.map(
+        lambda index, path, label: (
+            index, tf.io.decode_jpeg(tf.io.read_file(path), channels=3), label),
+        num_parallel_calls=tf.data.AUTOTUNE, deterministic=False)
+    fresh_ds = fresh_ds.map(
+        lambda index, img, label: with_shape(
+            index, tf.numpy_function(crop, [index, img], tf.uint8), label),
+        num_parallel_calls=tf.data.AUTOTUNE, deterministic=False)
+    # unreadable files and scans without a skull contour
+    fresh_ds = fresh_ds.apply(tf.data.experimental.ignore_errors())
+
+    ds = cached_ds.concatenate(fresh_ds)
+    ds = ds.batch(batch_size)
+    ds = ds.prefetch(tf.data.AUTOTUNE)
+    return ds
+
+
+def class_metrics(confusion):
+    """
+    Per-class precision, recall, F1 and support from a confusion matrix of
+    true rows and predicted columns
+    """
+    tp = np.diag(confusion).astype(np.float64)
+    predicted = confusion.sum(axis=0)
+    support = confusion.sum(axis=1)
+    precision = np.divide(tp, predicted, out=np.zeros_like(tp),
+                          where=predicted > 0)
+    recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall,
+                   out=np.zeros_like(tp), where=precision + recall > 0)
+    return precision, recall, f1, support
+
+
+def print_report(report, classes):
+    width = max(len(name) for name in classes)
+    print("Confusion matrix (rows true, columns predicted)")
+    print(" " * width + "".join(f"{name[:10]:>11s}" for name in classes))
+    for name, row in zip(classes, report["confusion_matrix"]):
+        print(f"{name:{width}s}" + "".join(f"{n:11d}" for n in row))
+    print()
+    print(f"{'':{width}s}  precision  recall      f1  support")
+    for name in classes:
+        m = report["classes"][name]
+        print(f"{name:{width}s}  {m['precision']:9.3f}  {m['recall']:6.3f}  "
+              f"{m['f1']:6.3f}  {m['support']:7d}")
+    print()
+    print(f"Accuracy {report['accuracy']:.4f}, macro F1 {report['macro_f1']:.4f} "
+          f"on {report['images']} images ({report['skipped']} skipped) in "
+          f"{report['seconds']:.2f}s: {report['images_per_second']:.1f} images/sec, "
+          f"{report['cache_hits']} cached crops")
+
+
+def run(args):
+    cls_to_id = load_class_to_id(args.classes)
+    classes = [name for name, _ in sorted(cls_to_id.items(),
+                                          key=lambda item: item[1])]
+    paths, labels = list_labelled(args.cohort, cls_to_id)
+    if not paths:
+        print("No labelled images found", file=sys.stderr)
+        return 1
+
+    model = load_runtime_model("brain_tumor", path=args.model)
+    cache = None if args.no_cache else CropCache(args.cache_dir, paths)
+    ds = make_dataset(paths, labels, batch_size=args.batch_size, cache=cache)
+    earlier_failures = (np.flatnonzero(np.asarray(cache.state) == FAILED)
+                        if cache is not None else [])
+    received = np.zeros(len(paths), bool)
+
+    confusion = np.zeros((len(classes), len(classes)), np.int64)
+    count = 0
+    start = time.perf_counter()
+    try:
+        for indices, images, batch_labels in ds:
+            indices = indices.numpy()
+            received[indices] = True
+            if cache is not None:
+                # the crop threads filled these rows before handing them on
+                cache.state[indices] = CROPPED
+            probs = model.predict_on_batch(tf.cast(images, tf.float32))
+            predicted = np.asarray(probs).argmax(axis=1)
+            np.add.at(confusion, (batch_labels.numpy(), predicted), 1)
+
+            count += len(predicted)
+            elapsed = time.perf_counter() - start
+            print(f"\r{count}/{len(paths)} images, {count / elapsed:.1f} images/sec",
+                  end="", file=sys.stderr)
+        print(file=sys.stderr)
+    finally:
+        if cache is not None:
+            cache.flush()
+    elapsed = time.perf_counter() - start
+
+    for index in earlier_failures:
+        print(f"Skipped {paths[index]}: failed in an earlier run",
+              file=sys.stderr)
+    new_failures = np.flatnonzero(~received)
+    new_failures = new_failures[~np.isin(new_failures, earlier_failures)]
+    for index in new_failures:
+        print(f"Skipped {paths[index]}: cannot be decoded or has no skull "
+              f"contour", file=sys.stderr)
+        if cache is not None:
+            cache.state[index] = FAILED
+    if cache is not None:
+        cache.flush()
+    precision, recall, f1, support = class_metrics(confusion)
+    report = {"cohort": args.cohort,
+              "images": count,
+              "skipped": len(paths) - count,
+              "seconds": elapsed,
+              "images_per_second": count / elapsed if elapsed else 0.0,
+              "cache_hits": cache.hits if cache is not None else 0,
+              "accuracy": float(np.trace(confusion) / count) if count else 0.0,
+              "macro_f1": float(f1.mean()),
+              "classes": {name: {"precision": float(precision[i]),
+                                 "recall": float(recall[i]),
+                                 "f1": float(f1[i]),
+                                 "support": int(support[i])}
+                          for i, name in enumerate(classes)},
+              "confusion_matrix": confusion.tolist()}
+    print_report(report, classes)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluate the brain tumor classifier on a labelled cohort")
+    parser.add_argument("cohort",
+                        help="folder with one subfolder of jpegs per class "
+                             "in class_to_id.txt")
+    parser.add_argument("-o", "--output", default=None,
+                        help="json report with the confusion matrix and "
+                             "per-class metrics")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--cache-dir", default="crop_cache",
+                        help="memory-mapped cache of the cohort's cropped "
+                             "images, about 192 KB per image")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--model", default="brain_tumor_detector.h5",
+                        help="keras model, MODEL_BACKEND selects tflite instead")
+    parser.add_argument("--classes", default="class_to_id.txt")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -0,0 +1,128 @@
+import hashlib
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import cv2
+import imutils
+
+# bump when crop_img changes so stale cache entries are not reused
+CROP_VERSION = 1
+
+
+def crop_img(img, image_size=(256, 256)):
+    """
+    Finds the extreme points on the image and crops the rectangular out of them
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+
+    # threshold the image, then perform a series of erosions +
+    # dilations to remove any small regions of noise
+    thresh = cv2.threshold(gray, 45, 255, cv2.THRESH_BINARY)[1]
+    thresh = cv2.erode(thresh, None, iterations=2)
+    thresh = cv2.dilate(thresh, None, iterations=2)
+
+    # find contours in thresholded image, then grab the largest one
+    cnts = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cnts = imutils.grab_contours(cnts)
+    c = max(cnts, key=cv2.contourArea)
+
+    # find the extreme points
+    extLeft = tuple(c[c[:, :, 0].argmin()][0])
+    extRight = tuple(c[c[:, :, 0].argmax()][0])
+    extTop = tuple(c[c[:, :, 1].argmin()][0])
+    extBot = tuple(c[c[:, :, 1].argmax()][0])
+    ADD_PIXELS = 0
+    new_img = img[extTop[1]-ADD_PIXELS:extBot[1]+ADD_PIXELS, extLeft[0]-ADD_PIXELS:extRight[0]+ADD_PIXELS].copy()
+
+    # resize image
+    new_img = cv2.resize(new_img, image_size)
+
+    return new_img
+
+
+def decode_jpeg(data):
+    # OpenCV instead of tf.io.decode_jpeg so the crop workers need no
+    # TensorFlow. tf.io.decode_jpeg defaults to libjpeg's fast integer IDCT
+    # and OpenCV to the accurate one, so pixels can differ by a few levels
+    # from the app's decode; the threshold of 45 and the resize to 256x256
+    # make crops robust to that, but they are not guaranteed bit-identical
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Unable to decode image")
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def cache_key(data, image_size):
+    h = hashlib.sha1(data)
+    h.update(f"{image_size[0]}x{image_size[1]}:v{CROP_VERSION}".encode())
+    return h.hexdigest()
+
+
+def crop_file(path, image_size=(256, 256), cache_dir=None):
+    """
+    Decodes and crops one image file, reusing the on-disk result when the
+    same content was cropped before. Returns (image, cache_hit)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    cache_path = None
+    if cache_dir is not None:
+        key = cache_key(data, image_size)
+        cache_path = os.path.join(cache_dir, key[:2], key + ".npy")
+        if os.path.exists(cache_path):
+            try:
+                return np.load(cache_path), True
+            except (OSError, ValueError):
+                pass
+
+    img = crop_img(decode_jpeg(data), image_size=image_size)
+
+    if cache_path is not None:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, img)
+        os.replace(tmp_path, cache_path)
+
+    return img, False
+
+
+def _crop_job(path, image_size, cache_dir):
+    try:
+        img, hit = crop_file(path, image_size=image_size, cache_dir=cache_dir)
+        return img, hit, None
+    except Exception as e:
+        return None, False, str(e)
+
+
+def crop_files(paths, image_size=(256, 256), cache_dir=None, workers=None):
+    """
+    Crops images across a process pool and yields (path, image, cache_hit,
+    error) in input order. Only a bounded number of jobs is in flight so
+    memory does not grow with the number of paths
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        for path in paths:
+            yield (path,) + _crop_job(path, image_size, cache_dir)
+        return
+
+    max_pending = workers * 4
+    pending = deque()
+    # spawn, since this runs from tf.data threads and forking a process with
+    # TensorFlow's thread pools running can deadlock
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        for path in paths:
+            pending.append((path, pool.submit(_crop_job, path, image_size,
+                                              cache_dir)))
+            if len(pending) >= max_pending:
+                done_path, future = pending.popleft()
+                yield (done_path,) + future.result()
+        while pending:
+            done_path, future = pending.popleft()
+            yield (done_path,) + future.result()
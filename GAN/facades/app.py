@@ -1,15 +1,37 @@
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.startup import timeline, BackgroundModel
 import tkinter as tk
 from tkinter import ttk, filedialog
 from PIL import ImageTk, Image
+import numpy as np
 import tensorflow as tf
+from common.decode import decode_resized
+from common.executor import InferenceExecutor
+from common.models import load_runtime_model
+from common.instrument import Instrument
+from common.result_cache import ResultCache, model_identity
+timeline.mark("import")
 
 
 class App(tk.Tk):
     def __init__(self, title="window", window_size=(200, 200), icon=None):
         super().__init__()
         
-        self.model = tf.keras.models.load_model("p2p_gen_facades.keras", 
-                                                        compile=False)
+        self.model = None
+        self.model_loader = BackgroundModel(
+            lambda: load_runtime_model("facades", training=True),
+            warmup=lambda model: model(tf.zeros((1, 256, 256, 3))))
+        
+        self.result_cache = ResultCache(model_identity("facades", "training"))
+        
+        # F9 captures a tf.profiler trace of the next 10 conversions
+        self.instrument = Instrument("facades")
+        self.bind("<F9>", self.on_profile)
+        self.executor = InferenceExecutor(self)
+        
         self.image_path = None
         self.input_image = None
         self.output_image = None
@@ -17,6 +39,9 @@ class App(tk.Tk):
         
         self.setup_window(title, window_size, icon=icon)
         self.layout_ui()
+        timeline.mark("window")
+        self.model_loader.when_done(self, self.on_model_ready)
+        
     def setup_window(self, title, size=None, icon=None):
         self.title(title)
         
@@ -53,11 +78,29 @@ class App(tk.Tk):
                                              width=self.image_size[0], 
                                              height=self.image_size[1])
         self.output_image_canvas.pack_forget()
+        
+        self.msg_label = ttk.Label(self, text="模型載入中...")
+        self.msg_label.pack()
+        self.convert_btn.state(["disabled"])
+
+    def on_model_ready(self, loader):
+        if loader.error is not None:
+            self.msg_label["text"] = f"模型載入失敗: {loader.error}"
+            return
+        self.model = loader.model
+        self.convert_btn.state(["!disabled"])
+        self.msg_label["text"] = "模型就緒"
     
     def on_open_image(self):
         f_types = [("image jpg", ".jpg .jpeg")]
-        self.image_path = filedialog.askopenfilename(filetypes=f_types)
+        image_path = filedialog.askopenfilename(filetypes=f_types)
+        if not image_path:
+            return
+        # a conversion still running for the previous image is stale now
+        self.executor.cancel_all()
+        self.image_path = image_path
         with Image.open(self.image_path) as img:
+            img.draft("RGB", self.image_size)
             img = img.resize(self.image_size)
             self.input_image = ImageTk.PhotoImage(img)
             
@@ -78,29 +121,58 @@ class App(tk.Tk):
                                                   image=self.output_image)
             self.output_image_canvas.pack(after=self.convert_btn)
             
+    def on_profile(self, event=None):
+        if self.instrument.profile(10):
+            self.msg_label["text"] = (f"Profiler 擷取接下來 10 次推論至 "
+                                      f"{self.instrument.profile_dir}")
+    
     def on_convert_image(self):
         if self.image_path is not None:
-            output_img_arr = self.tf_convert_image(self.image_path)
+            image_path = self.image_path
+            # repeated clicks on the same image join the job already queued
+            self.executor.submit(
+                lambda: self.result_cache.get_or_compute(
+                    image_path, lambda: self.tf_convert_image(image_path)),
+                self.on_converted, key=image_path)
+            self.msg_label["text"] = f"轉換中... ({self.executor.summary()})"
+    
+    def on_converted(self, job):
+        if job.error is not None:
+            self.msg_label["text"] = f"轉換失敗: {job.error}"
+            return
+        output_img_arr, hit = job.result
+        with self.instrument.stage("display"):
             output_image_pil = Image.fromarray(output_img_arr)
             self.output_image = ImageTk.PhotoImage(output_image_pil)
             self.show_output_image()
+        self.instrument.record("total", time.perf_counter() - job.submitted)
+        if not hit:
+            timeline.interval("first_inference", job.latency)
+        self.msg_label["text"] = (("使用快取結果" if hit else "轉換完成")
+                                  + f" (快取命中 {self.result_cache.hits}"
+                                  f" / 未命中 {self.result_cache.misses})"
+                                  + f"\n{self.instrument.summary()}"
+                                  + f"\n{self.executor.summary()}")
             
     def tf_convert_image(self, img_path):
         input_data = self.get_input_data(img_path)
-        output = self.model(input_data, training=True)
-        output_img = tf.squeeze(output, axis=0)
-        output_img = output_img * 127.5 + 127.5
-        output_img = tf.cast(output_img, tf.uint8)
+        with self.instrument.stage("inference"):
+            output = np.asarray(self.model(input_data))
+        with self.instrument.stage("postprocess"):
+            output_img = tf.squeeze(output, axis=0)
+            output_img = output_img * 127.5 + 127.5
+            output_img = tf.cast(output_img, tf.uint8)
+            output_img = output_img.numpy()
         
-        return output_img.numpy()
+        return output_img
     
     def get_input_data(self, img_path):
-        input_img = tf.io.read_file(img_path)
-        input_img = tf.io.decode_jpeg(input_img, 3)
-        input_img = tf.cast(input_img, tf.float32)
-        input_img = (input_img - 127.5) / 127.5
-        input_img = tf.image.resize(input_img, self.image_size)
-        input_img = tf.expand_dims(input_img, axis=0)
+        with self.instrument.stage("decode"):
+            input_img = decode_resized(tf.io.read_file(img_path),
+                                       self.image_size)
+        with self.instrument.stage("preprocess"):
+            input_img = (input_img - 127.5) / 127.5
+            input_img = tf.expand_dims(input_img, axis=0)
         
         return input_img
  
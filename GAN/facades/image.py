@@ -1,26 +1,53 @@
-import tensorflow as tf
-import cv2
-import matplotlib.pyplot as plt
+import argparse
+import os
 import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.convert_dir import add_arguments, convert_dir, print_summary
 
-model = tf.keras.models.load_model("p2p_gen_facades.keras", compile=False)
-
-img_filepath = "test_images/test1.jpg"
-
-input_img = tf.io.read_file(img_filepath)
-input_img = tf.io.decode_jpeg(input_img, 3)
-input_img = tf.cast(input_img, tf.float32)
-input_img = (input_img - 127.5) / 127.5
-input_img = tf.image.resize(input_img, (256, 256))
-input_img = tf.expand_dims(input_img, axis=0)
-output_img = model(input_img, training=True) 
-output_img = tf.squeeze(output_img, axis=0)
-output_img = output_img * 127.5 + 127.5
-output_img = tf.cast(output_img, tf.uint8)
-output_img = cv2.cvtColor(output_img.numpy(), cv2.COLOR_RGB2BGR)
-
-input_cv = cv2.imread(img_filepath)
-cv2.imshow("Input", input_cv)
-cv2.imshow("Ouput", output_img)
-cv2.waitKey(0)
-cv2.destroyAllWindows()
+
+def show_one(img_filepath):
+    import tensorflow as tf
+    import cv2
+    from common.decode import load_normalized
+    from common.models import load_runtime_model
+
+    model = load_runtime_model("facades", training=True)
+
+    input_img = load_normalized(img_filepath, (256, 256))
+    input_img = tf.expand_dims(input_img, axis=0)
+    output_img = model(input_img)
+    output_img = tf.squeeze(output_img, axis=0)
+    output_img = output_img * 127.5 + 127.5
+    output_img = tf.cast(output_img, tf.uint8)
+    output_img = cv2.cvtColor(output_img.numpy(), cv2.COLOR_RGB2BGR)
+
+    input_cv = cv2.imread(img_filepath)
+    cv2.imshow("Input", input_cv)
+    cv2.imshow("Ouput", output_img)
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert an image, or a directory of images, with the "
+                    "pix2pix facades generator")
+    parser.add_argument("input", nargs="?", default="test_images/test1.jpg",
+                        help="image to show, or directory to convert")
+    parser.add_argument("-o", "--output", default="output_images",
+                        help="output directory when input is a directory")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input):
+        show_one(args.input)
+        return 0
+
+    print_summary(convert_dir("facades", args.input, args.output,
+                              workers=args.workers,
+                              batch_size=args.batch_size, training=True))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,54 @@
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.startup import timeline, BackgroundModel
 import tkinter as tk
 from tkinter import ttk, filedialog
 from PIL import ImageTk, Image
 import tensorflow as tf
+from enhance_job import EnhanceJob
+from tiling import enhance_tiled
+from common.instrument import Instrument
+from common.result_cache import ResultCache, model_identity
+timeline.mark("import")
 
 
 class App(tk.Tk):
-    def __init__(self, title="window", window_size=(200, 200), icon=None):
+    def __init__(self, title="window", window_size=(200, 200), icon=None,
+                 tile_size=256, tile_overlap=16, tile_batch_size=4):
         super().__init__()
         
-        self.model = tf.keras.models.load_model("esrgan-tf2")
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_batch_size = tile_batch_size
+        
+        self.model = None
+        warmup_shape = (tile_batch_size, tile_size, tile_size, 3)
+        self.model_loader = BackgroundModel(
+            lambda: tf.keras.models.load_model("esrgan-tf2"),
+            warmup=lambda model: model(tf.zeros(warmup_shape)))
+        self.result_cache = ResultCache(
+            model_identity("esrgan", tile_size, tile_overlap))
+        # F9 captures a tf.profiler trace of the next 10 enhancements
+        self.instrument = Instrument("enhance")
+        self.bind("<F9>", self.on_profile)
         
         self.image_path = None
         self.input_image = None
         self.output_image = None
         self.canvas_size = (512,512)
+        # the running EnhanceJob, its partial output drawn into display_image
+        self.job = None
+        self.job_key = None
+        self.job_start = None
+        self.display_image = None
+        self.painted_rows = 0
         
         self.setup_window(title, window_size, icon=icon)
         self.layout_ui()
+        timeline.mark("window")
+        self.model_loader.when_done(self, self.on_model_ready)
         
     def setup_window(self, title, size=None, icon=None):
         self.title(title)
@@ -54,19 +86,26 @@ class App(tk.Tk):
                                          command=self.on_open_image)
         self.open_image_btn.grid(pady=(10, 10))
         
-        self.convert_btn = ttk.Button(self.top_frame, text="強化",
+        self.enhance_btn = ttk.Button(self.top_frame, text="強化",
                                       style="btn.TButton",
                                       command=self.enhance_image)
-        self.convert_btn.grid(pady=(0, 10))
+        self.enhance_btn.grid(pady=(0, 10))
+        self.enhance_btn.state(["disabled"])
         
-        self.convert_btn = ttk.Button(self.top_frame, text="儲存",
-                                      style="btn.TButton",
-                                      command=self.save_output)
-        self.convert_btn.grid(pady=(0, 10))
+        self.save_btn = ttk.Button(self.top_frame, text="儲存",
+                                   style="btn.TButton",
+                                   command=self.save_output)
+        self.save_btn.grid(pady=(0, 10))
         
-        self.msg_label = ttk.Label(self.top_frame, text="")
+        self.msg_label = ttk.Label(self.top_frame, text="模型載入中...")
         self.msg_label.grid(pady=(0, 10))
         
+        self.progress = ttk.Progressbar(self.top_frame, orient='horizontal',
+                                        mode='determinate',
+                                        length=280)
+        self.progress.grid(pady=(0, 10))
+        self.progress.grid_forget()
+        
         self.input_image_canvas = tk.Canvas(self.bottom_frame, 
                                             width=self.canvas_size[0], 
                                             height=self.canvas_size[1])
@@ -78,10 +117,17 @@ class App(tk.Tk):
                                             width=self.canvas_size[0], 
                                             height=self.canvas_size[1])
         self.output_image_canvas.grid(row=0, column=1)
-        
-        
+
+    def on_model_ready(self, loader):
+        if loader.error is not None:
+            self.msg_label["text"] = f"模型載入失敗: {loader.error}"
+            return
+        self.model = loader.model
+        self.enhance_btn.state(["!disabled"])
+        self.msg_label["text"] = "模型就緒"
     
     def on_open_image(self):
+        self.cancel_enhance()
         self.msg_label["text"] = ""
         
         f_types = [("image jpg", ".jpg .jpeg .png")]
@@ -90,6 +136,7 @@ class App(tk.Tk):
         
         if self.image_path:
             with Image.open(self.image_path) as img:
+                img.draft("RGB", self.canvas_size)
                 img = img.resize(self.canvas_size)
                 self.input_image = ImageTk.PhotoImage(img)
                 
@@ -114,34 +161,154 @@ class App(tk.Tk):
             output_img.save("output_enhanced.jpg")
             self.msg_label["text"] = "儲存成功!"
             
+    def on_profile(self, event=None):
+        if self.instrument.profile(10):
+            self.msg_label["text"] = (f"Profiler 擷取接下來 10 次推論至 "
+                                      f"{self.instrument.profile_dir}")
+    
     def enhance_image(self):
-        if self.image_path is not None:
-            output_image = self.tf_enhance_image(self.image_path)
-            output_image = tf.clip_by_value(output_image, 0, 255)
-            output_image = tf.cast(output_image, tf.uint8)
-            
-            image = Image.fromarray(output_image.numpy())
+        if self.image_path is None:
+            return
+        self.cancel_enhance()
+        start = time.perf_counter()
+        key = self.result_cache.key(self.image_path)
+        output_image = self.result_cache.get(key)
+        if output_image is not None:
+            self.show_result(output_image, hit=True)
+            self.instrument.record("total", time.perf_counter() - start)
+            return
+        
+        image_path = self.image_path
+        self.job = EnhanceJob(self.model,
+                              lambda: self.get_input_data(image_path),
+                              preview_size=self.canvas_size,
+                              tile_size=self.tile_size,
+                              overlap=self.tile_overlap,
+                              batch_size=self.tile_batch_size)
+        self.job_key = key
+        self.job_start = start
+        self.display_image = None
+        self.painted_rows = 0
+        self.enhance_btn.state(["disabled"])
+        self.save_btn.state(["disabled"])
+        self.progress["value"] = 0
+        self.progress.grid()
+        self.msg_label["text"] = "強化中..."
+        self.poll_enhance(self.job)
+    
+    def cancel_enhance(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+            self.progress.grid_forget()
+            self.save_btn.state(["!disabled"])
+            if self.model is not None:
+                self.enhance_btn.state(["!disabled"])
+    
+    def poll_enhance(self, job):
+        """
+        Draws whatever the job finished since the last poll and reschedules
+        itself until the job is done. Polls of a replaced job stop here
+        """
+        if job is not self.job:
+            return
+        
+        if job.preview is not None and self.display_image is None:
+            self.display_image = Image.fromarray(job.preview).resize(
+                self.canvas_size)
+            self.output_image = ImageTk.PhotoImage(self.display_image)
+            self.show_output_image()
+        
+        if job.out is not None and self.display_image is not None:
+            self.paint_rows(job)
+            self.progress["value"] = job.progress * 100
+            self.msg_label["text"] = f"強化中 {job.progress:.0%}"
+        
+        if not job.done():
+            self.after(50, self.poll_enhance, job)
+            return
+        
+        self.job = None
+        self.progress.grid_forget()
+        self.enhance_btn.state(["!disabled"])
+        self.save_btn.state(["!disabled"])
+        if job.error is not None:
+            self.msg_label["text"] = f"強化失敗: {job.error}"
+        elif job.result is not None:
+            self.result_cache.put(self.job_key, job.result)
+            self.instrument.record("inference", job.inference_seconds)
+            self.instrument.record("postprocess",
+                                   job.enhance_seconds - job.inference_seconds)
+            self.show_result(job.result, hit=False)
+            self.instrument.record("total", time.perf_counter() - self.job_start)
+            timeline.interval("first_inference",
+                              time.perf_counter() - self.job_start)
+    
+    def paint_rows(self, job):
+        """
+        Replaces the preview with the canvas rows whose output rows are all
+        final
+        """
+        out_h = job.out.shape[0]
+        canvas_w, canvas_h = self.canvas_size
+        done = job.rows_done * canvas_h // out_h
+        if done <= self.painted_rows:
+            return
+        src0 = self.painted_rows * out_h // canvas_h
+        src1 = min(job.rows_done, -(-done * out_h // canvas_h))
+        band = Image.fromarray(job.out[src0:max(src1, src0 + 1)])
+        band = band.resize((canvas_w, done - self.painted_rows))
+        self.display_image.paste(band, (0, self.painted_rows))
+        self.output_image.paste(self.display_image)
+        self.painted_rows = done
+    
+    def show_result(self, output_image, hit):
+        with self.instrument.stage("display"):
+            image = Image.fromarray(output_image)
             image = image.resize((self.canvas_size))
 
             self.output_image = ImageTk.PhotoImage(image)
             
             self.show_output_image()
+        self.msg_label["text"] = (("使用快取結果" if hit else "強化完成")
+                                  + f" (快取命中 {self.result_cache.hits}"
+                                  f" / 未命中 {self.result_cache.misses})"
+                                  + f"\n{self.instrument.summary()}")
             
     def tf_enhance_image(self, img_path):
         input_data = self.get_input_data(img_path)
-        output_data = self.model(input_data)
-        output = tf.squeeze(output_data, axis=0)
+        
+        # tile batches are timed as inference, blending them as postprocess
+        inference_time = 0.0
+        def predict(tiles):
+            nonlocal inference_time
+            start = time.perf_counter()
+            output = self.model(tiles).numpy()
+            inference_time += time.perf_counter() - start
+            return output
+        
+        start = time.perf_counter()
+        output = enhance_tiled(predict,
+                               input_data,
+                               tile_size=self.tile_size,
+                               overlap=self.tile_overlap,
+                               batch_size=self.tile_batch_size)
+        self.instrument.record("inference", inference_time)
+        self.instrument.record("postprocess",
+                               time.perf_counter() - start - inference_time)
         
         return output
     
     def get_input_data(self, img_path):
-        input_img = tf.image.decode_image(tf.io.read_file(img_path))
-        if input_img.shape[-1] == 4:
-            input_img = input_img[...,:-1]
-        size = (tf.convert_to_tensor(input_img.shape[:-1]))
-        input_img = tf.image.crop_to_bounding_box(input_img, 0, 0, size[0], size[1])
-        input_img = tf.cast(input_img, tf.float32)
-        input_img = tf.expand_dims(input_img, axis=0)
+        with self.instrument.stage("decode"):
+            input_img = tf.image.decode_image(tf.io.read_file(img_path))
+            if input_img.shape[-1] == 4:
+                input_img = input_img[...,:-1]
+            size = (tf.convert_to_tensor(input_img.shape[:-1]))
+            input_img = tf.image.crop_to_bounding_box(input_img, 0, 0, size[0], size[1])
+            
+            # kept as uint8, tiles are cast to float32 one batch at a time
+            input_img = input_img.numpy()
         
         return input_img
  
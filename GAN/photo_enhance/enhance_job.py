@@ -0,0 +1,88 @@
+import threading
+import time
+import numpy as np
+import tensorflow as tf
+from tiling import EnhanceCancelled, enhance_tiled
+
+
+class EnhanceJob:
+    """
+    Enhances one image on a worker thread.
+
+    load() is called on the worker to decode the (H, W, 3) uint8 input.
+    The worker first super-resolves a copy shrunk to preview_size / scale in
+    a single model call, then runs the tiled pass into out, advancing
+    rows_done as rows of tiles finish so the Tk thread can draw them while
+    the rest is still running. cancel() stops the tiled pass at the next
+    batch
+    """
+
+    def __init__(self, model, load, preview_size=(512, 512), scale=4,
+                 tile_size=256, overlap=16, batch_size=4):
+        self.model = model
+        self.preview_size = preview_size
+        self.scale = scale
+
+        self.out = None
+        self.preview = None
+        self.rows_done = 0
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.inference_seconds = 0.0
+        self.enhance_seconds = 0.0
+
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(load, tile_size, overlap, batch_size),
+            daemon=True)
+        self._thread.start()
+
+    def _predict(self, tiles):
+        start = time.perf_counter()
+        output = self.model(tiles).numpy()
+        self.inference_seconds += time.perf_counter() - start
+        return output
+
+    def _on_rows(self, y0, y1):
+        self.rows_done = y1
+
+    def _run(self, load, tile_size, overlap, batch_size):
+        try:
+            image = load()
+            h, w = image.shape[:2]
+
+            small = tf.image.resize(image[None],
+                                    (self.preview_size[1] // self.scale,
+                                     self.preview_size[0] // self.scale),
+                                    method="area")
+            preview = self.model(small).numpy()[0]
+            self.preview = np.clip(np.rint(preview), 0, 255).astype(np.uint8)
+
+            self.out = np.empty((h * self.scale, w * self.scale, 3), np.uint8)
+            start = time.perf_counter()
+            enhance_tiled(self._predict, image, scale=self.scale,
+                          tile_size=tile_size, overlap=overlap,
+                          batch_size=batch_size, out=self.out,
+                          on_rows=self._on_rows, should_stop=self._stop.is_set)
+            self.enhance_seconds = time.perf_counter() - start
+            self.result = self.out
+        except EnhanceCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    @property
+    def progress(self):
+        if self.out is None:
+            return 0.0
+        return self.rows_done / self.out.shape[0]
+
+    def cancel(self):
+        self._stop.set()
+
+    def done(self):
+        return self._done.is_set()
@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class EnhanceCancelled(Exception):
+    pass
+
+
+def _tile_starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, tile - overlap))
+    starts.append(length - tile)
+    return starts
+
+
+def _axis_weights(starts, tile, length, overlap, scale):
+    """
+    Feathered weights along one axis, one row per tile, normalised so the
+    weights of overlapping tiles sum to one at every output pixel
+    """
+    ramp_len = overlap * scale
+    base = np.ones(tile * scale, np.float32)
+    if ramp_len > 0:
+        ramp = (np.arange(ramp_len, dtype=np.float32) + 0.5) / ramp_len
+        base[:ramp_len] = np.minimum(base[:ramp_len], ramp)
+        base[-ramp_len:] = np.minimum(base[-ramp_len:], ramp[::-1])
+
+    total = np.zeros(length * scale, np.float32)
+    for start in starts:
+        total[start * scale:(start + tile) * scale] += base
+    return [base / total[start * scale:(start + tile) * scale]
+            for start in starts]
+
+
+def enhance_tiled(predict_fn, image, scale=4, tile_size=256, overlap=16,
+                  batch_size=4, out=None, on_rows=None, should_stop=None):
+    """
+    Super-resolves an (H, W, 3) uint8 image tile by tile.
+
+    Tiles of tile_size overlap by overlap pixels and are blended with
+    feathered weights to hide seams. Tiles are fed to predict_fn in fixed
+    size float32 batches of batch_size, and only one row of tiles is
+    accumulated at a time, so working memory depends on the tile size and the
+    image width rather than the whole image. out may be a preallocated
+    (H*scale, W*scale, 3) uint8 array such as a np.memmap.
+
+    on_rows(y0, y1) is called whenever output rows y0 to y1 are final, top
+    to bottom. should_stop() is checked before every batch and raises
+    EnhanceCancelled when it returns True
+    """
+    if overlap < 0 or overlap * 2 >= tile_size:
+        raise ValueError("overlap must be smaller than half the tile size")
+
+    h, w = image.shape[:2]
+    th, tw = min(tile_size, h), min(tile_size, w)
+    ys = _tile_starts(h, th, overlap)
+    xs = _tile_starts(w, tw, overlap)
+    wy = _axis_weights(ys, th, h, overlap, scale)
+    wx = _axis_weights(xs, tw, w, overlap, scale)
+
+    if out is None:
+        out = np.empty((h * scale, w * scale, 3), np.uint8)
+    stripe = np.zeros((th * scale, w * scale, 3), np.float32)
+    batch = np.zeros((batch_size, th, tw, 3), np.float32)
+
+    for row, y in enumerate(ys):
+        for first in range(0, len(xs), batch_size):
+            if should_stop is not None and should_stop():
+                raise EnhanceCancelled()
+            cols = list(range(first, min(first + batch_size, len(xs))))
+            for i, col in enumerate(cols):
+                batch[i] = image[y:y + th, xs[col]:xs[col] + tw]
+            # unused slots keep stale tiles so the batch shape never changes
+            output = np.asarray(predict_fn(batch))
+
+            for i, col in enumerate(cols):
+                weight = wy[row][:, None, None] * wx[col][None, :, None]
+                x0 = xs[col] * scale
+                stripe[:, x0:x0 + tw * scale] += output[i] * weight
+
+        # rows above the next tile row receive no more contributions
+        next_y = ys[row + 1] if row + 1 < len(ys) else h
+        done = (next_y - y) * scale
+        np.rint(stripe[:done], out=stripe[:done])
+        np.clip(stripe[:done], 0, 255, out=stripe[:done])
+        out[y * scale:next_y * scale] = stripe[:done].astype(np.uint8)
+        stripe[:th * scale - done] = stripe[done:]
+        stripe[th * scale - done:] = 0
+        if on_rows is not None:
+            on_rows(y * scale, next_y * scale)
+
+    return out
@@ -1,19 +1,43 @@
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.startup import timeline, BackgroundModel
 import tkinter as tk
 from tkinter import ttk, filedialog
 from PIL import ImageTk, Image
+import numpy as np
 import tensorflow as tf
-from instance_norm import InstanceNormalization
+from common.buckets import BucketedGenerator
+from common.decode import decode_resized, encoded_size
+from common.executor import InferenceExecutor
+from common.models import load_runtime_model
+from common.instrument import Instrument
+from common.result_cache import ResultCache, model_identity
+timeline.mark("import")
 
 
 class App(tk.Tk):
-    def __init__(self, title="window", window_size=(200, 200), icon=None):
+    def __init__(self, title="window", window_size=(200, 200), icon=None,
+                 native=False):
         super().__init__()
         
-        custom_objects={"CycleGAN>InstanceNormalization":InstanceNormalization}
+        # run the generator near the photo's own resolution instead of 256x256
+        self.native = native
+        self.model = None
+        self.model_loader = BackgroundModel(
+            self.load_model,
+            warmup=lambda model: model(tf.zeros((1, 256, 256, 3))))
         
-        self.model = tf.keras.models.load_model("gen_f.h5",
-                                                custom_objects=custom_objects,
-                                                compile=False)
+        self.result_cache = ResultCache(
+            model_identity("vangogh", "native") if native
+            else model_identity("vangogh"))
+        
+        # F9 captures a tf.profiler trace of the next 10 conversions
+        self.instrument = Instrument("vangogh")
+        self.bind("<F9>", self.on_profile)
+        self.executor = InferenceExecutor(self)
         
         self.image_path = None
         self.input_image = None
@@ -23,6 +47,8 @@ class App(tk.Tk):
         
         self.setup_window(title, window_size, icon=icon)
         self.layout_ui()
+        timeline.mark("window")
+        self.model_loader.when_done(self, self.on_model_ready)
                                                         
     def setup_window(self, title, size=None, icon=None):
         self.title(title)
@@ -64,6 +90,10 @@ class App(tk.Tk):
                                       style="btn.TButton",
                                       command=self.on_convert_image)
         self.convert_btn.grid(pady=10)
+        self.convert_btn.state(["disabled"])
+        
+        self.msg_label = ttk.Label(self.top_frame, text="模型載入中...")
+        self.msg_label.grid(pady=(0, 10))
         
         self.input_image_canvas = tk.Canvas(self.bottom_frame, 
                                             width=self.canvas_size[0], 
@@ -74,11 +104,31 @@ class App(tk.Tk):
                                              width=self.canvas_size[0], 
                                              height=self.canvas_size[1])
         self.output_image_canvas.grid(row=0, column=1)
+
+    def on_model_ready(self, loader):
+        if loader.error is not None:
+            self.msg_label["text"] = f"模型載入失敗: {loader.error}"
+            return
+        self.model = loader.model
+        self.convert_btn.state(["!disabled"])
+        self.msg_label["text"] = "模型就緒"
+    
+    def load_model(self):
+        model = load_runtime_model("vangogh")
+        if self.native:
+            model = BucketedGenerator(model)
+        return model
     
     def on_open_image(self):
         f_types = [("image jpg", ".jpg .jpeg")]
-        self.image_path = filedialog.askopenfilename(initialdir=".", filetypes=f_types)
+        image_path = filedialog.askopenfilename(initialdir=".", filetypes=f_types)
+        if not image_path:
+            return
+        # a conversion still running for the previous image is stale now
+        self.executor.cancel_all()
+        self.image_path = image_path
         with Image.open(self.image_path) as img:
+            img.draft("RGB", self.canvas_size)
             img = img.resize(self.canvas_size)
             self.input_image = ImageTk.PhotoImage(img)
             
@@ -97,35 +147,83 @@ class App(tk.Tk):
                                                   anchor=tk.NW,
                                                   image=self.output_image)
             
+    def on_profile(self, event=None):
+        if self.instrument.profile(10):
+            self.msg_label["text"] = (f"Profiler 擷取接下來 10 次推論至 "
+                                      f"{self.instrument.profile_dir}")
+    
     def on_convert_image(self):
         if self.image_path is not None:
-            output_img_arr = self.tf_convert_image(self.image_path)
+            image_path = self.image_path
+            # repeated clicks on the same image join the job already queued
+            self.executor.submit(
+                lambda: self.result_cache.get_or_compute(
+                    image_path, lambda: self.tf_convert_image(image_path)),
+                self.on_converted, key=image_path)
+            self.msg_label["text"] = f"轉換中... ({self.executor.summary()})"
+    
+    def on_converted(self, job):
+        if job.error is not None:
+            self.msg_label["text"] = f"轉換失敗: {job.error}"
+            return
+        output_img_arr, hit = job.result
+        with self.instrument.stage("display"):
             output_image_pil = Image.fromarray(output_img_arr)
             output_image_pil = output_image_pil.resize(self.canvas_size)
             self.output_image = ImageTk.PhotoImage(output_image_pil)
             self.show_output_image()
+        self.instrument.record("total", time.perf_counter() - job.submitted)
+        if not hit:
+            timeline.interval("first_inference", job.latency)
+        self.msg_label["text"] = (("使用快取結果" if hit else "轉換完成")
+                                  + f" (快取命中 {self.result_cache.hits}"
+                                  f" / 未命中 {self.result_cache.misses})"
+                                  + f"\n{self.instrument.summary()}"
+                                  + f"\n{self.executor.summary()}")
+        if self.native:
+            for bucket, stats in self.model.report().items():
+                self.msg_label["text"] += (f"\n{bucket}: {stats['calls']} 次,"
+                                           f" p50 {stats['p50_ms']:.0f} ms")
             
     def tf_convert_image(self, img_path):
         input_data = self.get_input_data(img_path)
-        output = self.model.predict(input_data, verbose=0)
-        output_img = tf.squeeze(output, axis=0)
-        output_img = output_img * 127.5 + 127.5
-        output_img = tf.cast(output_img, tf.uint8)
-        
-        return output_img.numpy()
+        with self.instrument.stage("inference"):
+            output = np.asarray(self.model(input_data))
+        with self.instrument.stage("postprocess"):
+            output_img = tf.squeeze(output, axis=0)
+            output_img = output_img * 127.5 + 127.5
+            output_img = tf.cast(output_img, tf.uint8)
+            output_img = output_img.numpy()
+        
+        return output_img
     
     def get_input_data(self, img_path):
-        input_img = tf.io.read_file(img_path)
-        input_img = tf.io.decode_jpeg(input_img, 3)
-        input_img = tf.cast(input_img, tf.float32)
-        input_img = (input_img - 127.5) / 127.5
-        input_img = tf.image.resize(input_img, self.image_size)
-        input_img = tf.expand_dims(input_img, axis=0)
+        with self.instrument.stage("decode"):
+            data = tf.io.read_file(img_path)
+            size = self.image_size
+            if self.native:
+                size = self.model.working_size(*encoded_size(data))
+            input_img = decode_resized(data, size)
+        with self.instrument.stage("preprocess"):
+            input_img = (input_img - 127.5) / 127.5
+            input_img = tf.expand_dims(input_img, axis=0)
         
         return input_img
  
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert photos with the CycleGAN generator in a window")
+    parser.add_argument("--native", action="store_true",
+                        help="convert near the photo's own resolution, "
+                             "padded to multiples of 256, instead of at "
+                             "256x256")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":              
+    args = parse_args()
     app = App(title="CycleGAN 圖像轉梵谷畫", 
               window_size=(1024, 768),
-              icon="icon.ico")
+              icon="icon.ico",
+              native=args.native)
     app.mainloop()            
\ No newline at end of file
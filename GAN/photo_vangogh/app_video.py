@@ -1,59 +1,58 @@
+import argparse
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from common.startup import timeline, BackgroundModel
 import tkinter as tk
 from tkinter import ttk, filedialog
-from PIL import ImageTk, Image
+import time
 import tensorflow as tf
-import cv2
-from instance_norm import InstanceNormalization
-
-class VideoCapture:
-    def __init__(self, source):
-        self.video_cap = cv2.VideoCapture(source)
-        if not self.video_cap.isOpened():
-            raise ValueError("Unable to open video source", source)
-        self.width = int(self.video_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.height = int(self.video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        self.fps = self.video_cap.get(cv2.CAP_PROP_FPS) 
-        self.frame_counts = int(self.video_cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.frame_num = 0
-
-    def get_frame(self):
-        if self.video_cap.isOpened():
-            ret, frame = self.video_cap.read()
-            if ret:
-                self.frame_num += 1
-                return (ret, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), 
-                        self.width, self.height)
-            else:
-                return (ret, None, self.width, self.height)
-        else:
-            raise ValueError("Unable to open video to get frame",)
-            
-    def __del__(self):
-        if self.video_cap and self.video_cap.isOpened():
-            self.video_cap.release()
+from common.buckets import BucketedGenerator
+from common.change_detector import ChangeDetector
+from common.instrument import Instrument
+from common.models import load_runtime_model
+from frame_view import FrameView
+from video_pipeline import VideoCapture, VideoPipeline, convert_frames
+from video_writer import CODECS, VideoWriterThread
+timeline.mark("import")
 
 class App(tk.Tk):
-    def __init__(self, title="window", window_size=(200, 200), icon=None):
+    def __init__(self, title="window", window_size=(200, 200), icon=None,
+                 output_path="output.avi", codec=None, upscale=False,
+                 skip_threshold=None, native=False):
         super().__init__()
         
-        custom_objects={"CycleGAN>InstanceNormalization":InstanceNormalization}
+        self.output_path = output_path
+        self.codec = codec
+        self.upscale = upscale
+        # mean abs difference below which a frame reuses the last output,
+        # None converts every frame
+        self.skip_threshold = skip_threshold
+        # convert near the video's own resolution instead of 256x256
+        self.native = native
+        self.convert_size = (256, 256)
         
-        self.model = tf.keras.models.load_model("gen_f.h5",
-                                                custom_objects=custom_objects,
-                                                compile=False)
+        self.model = None
+        self.model_loader = BackgroundModel(
+            self.load_model,
+            warmup=lambda model: model(tf.zeros((1, 256, 256, 3))))
         
         self.protocol('WM_DELETE_WINDOW', self.release)
+        
+        self.instrument = Instrument("video")
+        self.bind("<F9>", self.on_profile)
             
         self.video_path = None
         self.video_cap = None
         self.update_id = None
-        self.video_out = None
-        self.paint_frame = None
-        self.fourcc = cv2.VideoWriter_fourcc(*'DIVX')
+        self.pipeline = None
+        self.play_start = None
         self.image_size = (600, 600)
         
         self.setup_window(title, window_size, icon=icon)
         self.layout_ui()
+        timeline.mark("window")
+        self.model_loader.when_done(self, self.on_model_ready)
                                                         
     def setup_window(self, title, size=None, icon=None):
         self.title(title)
@@ -96,7 +95,10 @@ class App(tk.Tk):
                                          command=self.on_play_video)
         self.play_btn.grid()
         
-        self.msg_label = ttk.Label(self.top_frame, text="")
+        self.open_image_btn.state(["disabled"])
+        self.play_btn.state(["disabled"])
+        
+        self.msg_label = ttk.Label(self.top_frame, text="模型載入中...")
         self.msg_label.grid(pady=10)
         
         self.progress = ttk.Progressbar(self.top_frame, orient='horizontal',
@@ -115,100 +117,179 @@ class App(tk.Tk):
                                             height=self.image_size[1])
         self.paint_vid_canvas.grid(row=0, column=1)
         
+        self.original_view = FrameView(self.original_vid_canvas)
+        self.paint_view = FrameView(self.paint_vid_canvas)
+
+    def on_model_ready(self, loader):
+        if loader.error is not None:
+            self.msg_label["text"] = f"模型載入失敗: {loader.error}"
+            return
+        self.model = loader.model
+        self.open_image_btn.state(["!disabled"])
+        self.play_btn.state(["!disabled"])
+        self.msg_label["text"] = "模型就緒"
+        
+    def load_model(self):
+        model = load_runtime_model("vangogh", training=True)
+        if self.native:
+            model = BucketedGenerator(model)
+        return model
         
     def on_open_video(self):
         f_types = [("video mp4", ".mp4")]
         self.video_path = filedialog.askopenfilename(initialdir=".", filetypes=f_types)
         if self.video_path:
-            if self.update_id is not None:
-                self.after_cancel(self.update_id)
-                self.update_id = None
+            self.stop_pipeline()
             self.video_cap = VideoCapture(self.video_path)
             self.msg_label["text"] = self.video_path.split("/")[-1]
             self.progress["value"] = 0
-            self.update_frame(render_first_frame=True)
+            if self.native:
+                self.convert_size = self.model.working_size(
+                    self.video_cap.height, self.video_cap.width)
+            
+            ret, frame, _, _ = self.video_cap.get_frame()
+            if ret:
+                self.show_frames(frame, self.tf_convert_image(frame))
+            self.video_cap.rewind()
     
     def on_play_video(self):
         if self.video_cap:
             result = tk.messagebox.askyesno("儲存影片", "儲存輸出影片?")
-            self.update_frame(write_output=result)
+            
+            self.stop_pipeline()
+            self.video_cap.rewind()
+            video_out = None
+            if result:
+                output_size = self.convert_size[::-1]
+                if self.upscale:
+                    output_size = (self.video_cap.width, self.video_cap.height)
+                # a full queue pauses conversion rather than dropping frames
+                # from the file; the display only ever shows the latest
+                # converted frame, so it skips ahead instead of stalling
+                video_out = VideoWriterThread(self.output_path,
+                                              fps=self.video_cap.fps,
+                                              output_size=output_size,
+                                              codec=self.codec,
+                                              block=True)
+            change_detector = None
+            if self.skip_threshold is not None:
+                change_detector = ChangeDetector(self.skip_threshold)
+            self.pipeline = VideoPipeline(self.video_cap, self.tf_convert_frames,
+                                          video_out=video_out,
+                                          change_detector=change_detector,
+                                          instrument=self.instrument)
+            self.play_start = time.perf_counter()
+            self.pipeline.start()
+            self.update_frame()
+            
+    def stop_pipeline(self):
+        if self.update_id is not None:
+            self.after_cancel(self.update_id)
+            self.update_id = None
+        if self.pipeline is not None:
+            # waits for the writer to finish the output file before a new
+            # writer opens it or the window closes
+            self.pipeline.shutdown(timeout=1)
+            self.pipeline = None
             
     def tf_convert_image(self, image):
-        input_img = tf.cast(image, tf.float32)
-        input_img = (input_img - 127.5) / 127.5
-        input_img = tf.image.resize(input_img, (256, 256))
-        input_img = tf.expand_dims(input_img, axis=0)
-        
-        output_img = self.model(input_img, training=True)
-        output_img = tf.squeeze(output_img, axis=0)
-        output_img = output_img * 127.5 + 127.5
-        output_img = tf.cast(output_img, tf.uint8)
+        return self.tf_convert_frames(image[None])[0]
+    
+    def tf_convert_frames(self, frames):
+        start = time.perf_counter()
+        output_frames = convert_frames(self.model, frames, self.convert_size,
+                                       instrument=self.instrument)
+        timeline.interval("first_inference", time.perf_counter() - start)
         
-        return output_img.numpy()
-            
-    def update_frame(self, render_first_frame=False, write_output=False):
-        if self.video_cap is None:
-            raise ValueError("No video capture")
+        return output_frames
             
-        if write_output:
-            if self.video_out is None:
-                self.video_out = cv2.VideoWriter("output.avi", 
-                                                 fourcc=self.fourcc,
-                                                 fps=self.video_cap.fps,
-                                                 frameSize=(256, 256))
-            if self.paint_frame is not None:
-                s_frame = cv2.cvtColor(self.paint_frame, cv2.COLOR_RGB2BGR)
-                self.video_out.write(s_frame)
-                
+    def update_frame(self):
+        if self.pipeline is None:
+            raise ValueError("No video pipeline")
             
-        ret, frame, width, height = self.video_cap.get_frame()
-        
-        if ret and frame is not None:
-            p = (self.video_cap.frame_num / self.video_cap.frame_counts) * 100
+        item = self.pipeline.latest_frame()
+        if item is not None:
+            frame_num, frame, paint_frame = item
+            p = (frame_num / self.video_cap.frame_counts) * 100
             self.progress["value"] = p
             self.progress.grid()
+            with self.instrument.stage("display"):
+                self.show_frames(frame, paint_frame)
+            self.msg_label["text"] = self.pipeline_status()
             
-            scale = height / width
-            w = int(self.image_size[0]*scale)
-            h = int(self.image_size[1]*scale)
-            
-            frame_resized = cv2.resize(frame, (w, h))
-            img = Image.fromarray(frame_resized)
-            self.origin_image = ImageTk.PhotoImage(image=img)
-            self.original_vid_canvas.configure(width=w, height=h)
-            self.original_vid_canvas.create_image(0,0,
-                                                  anchor=tk.NW,
-                                                  image=self.origin_image)
-            
-            
-            self.paint_frame = self.tf_convert_image(frame)
-            frame_resized = cv2.resize(self.paint_frame, (w, h))
-            img = Image.fromarray(frame_resized)
-            self.paint_image = ImageTk.PhotoImage(image=img)
-            self.paint_vid_canvas.configure(width=w, height=h)
-            self.paint_vid_canvas.create_image(0,0,
-                                                anchor=tk.NW,
-                                                image=self.paint_image)
-            
-            
-            if not render_first_frame:
-                self.update_id = self.after(33, 
-                                            lambda : self.update_frame(render_first_frame, 
-                                                                       write_output))
+        if self.pipeline.error is not None:
+            self.msg_label["text"] = f"轉換失敗: {self.pipeline.error}"
+            self.update_id = None
+        elif self.pipeline.finished():
+            self.msg_label["text"] = f"影片結束! {self.pipeline_status()}"
+            if self.native:
+                for bucket, stats in self.model.report().items():
+                    self.msg_label["text"] += (f"\n{bucket}: {stats['calls']} 次,"
+                                               f" p50 {stats['p50_ms']:.0f} ms")
+            self.update_id = None
         else:
-            self.video_out.release()
-            self.video_out = None
-            self.msg_label["text"] = "影片結束!"
+            self.update_id = self.after(15, self.update_frame)
+            
+    def pipeline_status(self):
+        pipeline = self.pipeline
+        elapsed = max(time.perf_counter() - self.play_start, 1e-6)
+        status = f"{pipeline.frames_converted / elapsed:.1f} fps"
+        if pipeline.change_detector is not None:
+            status += f", 略過 {pipeline.change_detector.skip_rate:.0%}"
+        if pipeline.video_out is not None:
+            status += (f", 寫入佇列 {pipeline.video_out.queue_depth}"
+                       f"/{pipeline.video_out.queue_size}")
+        return f"{status}\n{self.instrument.summary()}"
+    
+    def on_profile(self, event=None):
+        if self.instrument.profile(10):
+            self.msg_label["text"] = (f"Profiler 擷取接下來 10 次推論至 "
+                                      f"{self.instrument.profile_dir}")
+        
+    def show_frames(self, frame, paint_frame):
+        width, height = self.video_cap.width, self.video_cap.height
+        scale = height / width
+        w = int(self.image_size[0]*scale)
+        h = int(self.image_size[1]*scale)
+        
+        self.original_view.show(frame, (w, h))
+        self.paint_view.show(paint_frame, (w, h))
     
     def release(self):
-        if self.video_out:
-            self.video_out.release()
-            self.video_out = None
+        self.stop_pipeline()
+        self.instrument.close()
         self.destroy()
             
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert a video with the CycleGAN generator in a window")
+    parser.add_argument("-o", "--output", default="output.avi",
+                        help="where the converted video is saved")
+    parser.add_argument("--codec", default=None,
+                        help="fourcc, by default picked from the output "
+                             f"extension: {CODECS}")
+    parser.add_argument("--upscale", action="store_true",
+                        help="save frames at the source resolution instead "
+                             "of the converted size")
+    parser.add_argument("--skip-threshold", type=float, default=None,
+                        help="reuse the previous output for frames whose "
+                             "mean abs difference (0-255, on a 32x32 "
+                             "thumbnail) is below this, e.g. 2")
+    parser.add_argument("--native", action="store_true",
+                        help="convert near the source resolution, padded to "
+                             "multiples of 256, instead of at 256x256")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":              
+    args = parse_args()
     app = App(title="CycleGAN 影片轉梵谷", 
               window_size=(1024, 800),
-              icon="icon.ico")
+              icon="icon.ico",
+              output_path=args.output,
+              codec=args.codec,
+              upscale=args.upscale,
+              skip_threshold=args.skip_threshold,
+              native=args.native)
     app.mainloop()            
\ No newline at end of file
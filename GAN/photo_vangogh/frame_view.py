@@ -0,0 +1,54 @@
+import tkinter as tk
+import numpy as np
+import cv2
+from PIL import Image, ImageTk
+
+
+class FrameView:
+    """
+    Shows RGB frames on a canvas without per-frame allocations.
+
+    The resize target, the PIL image and the PhotoImage are allocated once
+    per display size, and each frame is resized into the buffer, copied into
+    the PIL image in place and pasted into the PhotoImage, which the single
+    canvas item keeps showing
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.size = None
+        self.buffer = None
+        self.image = None
+        self.photo = None
+        self.item = None
+
+    def render(self, frame, size):
+        """
+        Resizes an (H, W, 3) uint8 RGB frame to size, (width, height), into
+        the reused PIL image and returns it
+        """
+        if size != self.size:
+            w, h = size
+            self.size = size
+            self.buffer = np.zeros((h, w, 3), np.uint8)
+            self.image = Image.new("RGB", size)
+            self.photo = None
+        if frame.shape[1::-1] == size:
+            np.copyto(self.buffer, frame)
+        else:
+            cv2.resize(frame, size, dst=self.buffer)
+        self.image.frombytes(self.buffer.data)
+        return self.image
+
+    def show(self, frame, size):
+        image = self.render(frame, size)
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(image)
+            self.canvas.configure(width=size[0], height=size[1])
+            if self.item is None:
+                self.item = self.canvas.create_image(0, 0, anchor=tk.NW,
+                                                     image=self.photo)
+            else:
+                self.canvas.itemconfigure(self.item, image=self.photo)
+        else:
+            self.photo.paste(image)
@@ -5,48 +5,107 @@ Created on Wed Oct  4 10:51:47 2023
 @author: tomne
 """
 
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+import numpy as np
 import tensorflow as tf
 import cv2
 # import matplotlib.pyplot as plt
-import sys
-from instance_norm import InstanceNormalization
-
-custom_objects={"CycleGAN>InstanceNormalization":InstanceNormalization}
+from common.capture import HUD, LatestFrameCapture
+from common.change_detector import ChangeDetector
+from common.instrument import Instrument
+from common.models import load_runtime_model
 
-with tf.keras.saving.custom_object_scope(custom_objects):
-    model = tf.keras.models.load_model("gen_f.h5",
-                                       compile=False)
 
-
-cap = cv2.VideoCapture(0)
-if not cap.isOpened():
-    print("Unable to video capture")
-    cap.release()
-    sys.exit()
-    
-while True:
-    ret, frame = cap.read()
-    
-    if not ret:
-        print("Unable to retrieve frame")
-        break
-    
+def preprocess_frame(frame):
     frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     frame_rgb = cv2.resize(frame_rgb, (256, 256))
     frame_rgb = (frame_rgb - 127.5) / 127.5
-    input_img = tf.expand_dims(frame_rgb, axis=0)
-    
-    output_img = model.predict(input_img, verbose=0)
+    return tf.expand_dims(frame_rgb, axis=0)
+
+
+def postprocess_output(output_img):
     output_img = tf.squeeze(output_img, axis=0)
     output_img = output_img * 127.5 + 127.5
     output_img = tf.cast(output_img, tf.uint8)
-    output_img = cv2.cvtColor(output_img.numpy(), cv2.COLOR_RGB2BGR)
-    
-    cv2.imshow("Input", frame)
-    cv2.imshow("Output", output_img)
-    
-    if cv2.waitKey(1) == 27:
-        break
-
-cap.release()
-cv2.destroyAllWindows()
+    return cv2.cvtColor(output_img.numpy(), cv2.COLOR_RGB2BGR)
+
+
+def convert_frame(model, frame):
+    return postprocess_output(model(preprocess_frame(frame)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live webcam conversion")
+    parser.add_argument("--source", default="0",
+                        help="camera index or video file")
+    parser.add_argument("--unpaced", action="store_true",
+                        help="read video files as fast as possible instead "
+                             "of at their frame rate")
+    parser.add_argument("--skip-threshold", type=float, default=None,
+                        help="reuse the previous output while the mean abs "
+                             "difference (0-255) to the last converted frame "
+                             "stays below this, e.g. 2")
+    args = parser.parse_args(argv)
+
+    model = load_runtime_model("vangogh")
+
+    cap = LatestFrameCapture(args.source, paced=False if args.unpaced else None)
+    if not cap.isOpened():
+        print("Unable to video capture")
+        cap.release()
+        sys.exit()
+    cap.start()
+    hud = HUD()
+    # p captures a tf.profiler trace of the next 10 inferences
+    instrument = Instrument("vangogh_live")
+    change_detector = None
+    if args.skip_threshold is not None:
+        change_detector = ChangeDetector(args.skip_threshold)
+    last_output = None
+        
+    while True:
+        with instrument.stage("capture"):
+            ret, frame = cap.read()
+        
+        if not ret:
+            print("Unable to retrieve frame")
+            break
+        
+        if change_detector is None or change_detector.changed(frame):
+            start = time.perf_counter()
+            with instrument.stage("preprocess"):
+                input_img = preprocess_frame(frame)
+            with instrument.stage("inference"):
+                output_img = np.asarray(model(input_img))
+            with instrument.stage("postprocess"):
+                last_output = postprocess_output(output_img)
+            hud.update(time.perf_counter() - start)
+        else:
+            hud.update()
+        skip_rate = None if change_detector is None else change_detector.skip_rate
+        # the HUD draws on a copy so a reused output stays clean
+        output_img = hud.draw(last_output.copy(), dropped=cap.frames_dropped,
+                              skip_rate=skip_rate)
+        
+        with instrument.stage("display"):
+            cv2.imshow("Input", frame)
+            cv2.imshow("Output", output_img)
+        
+        key = cv2.waitKey(1)
+        if key == 27:
+            break
+        if key == ord("p") and instrument.profile(10):
+            print(f"Profiling the next 10 inferences to {instrument.profile_dir}")
+
+    print(instrument.summary())
+    instrument.close()
+    cap.release()
+    cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+import tensorflow as tf
+from common.buckets import BucketedGenerator
+from common.change_detector import ChangeDetector
+from common.models import load_runtime_model
+from video_pipeline import VideoCapture, VideoPipeline, convert_frames
+from video_writer import CODECS, VideoWriterThread
+
+
+def render(args):
+    model = load_runtime_model("vangogh", path=args.model, training=True)
+    video_cap = VideoCapture(args.input)
+    size = (256, 256)
+    if args.native:
+        model = BucketedGenerator(model, max_side=args.max_side)
+        size = model.working_size(video_cap.height, video_cap.width)
+    # trace outside the timed region
+    model(tf.zeros((args.batch_size,) + size + (3,)))
+
+    output_size = size[::-1]
+    if args.upscale:
+        output_size = (video_cap.width, video_cap.height)
+    # blocking writes pace inference to the encoder so no frame is lost
+    video_out = VideoWriterThread(args.output, fps=video_cap.fps,
+                                  output_size=output_size, codec=args.codec,
+                                  queue_size=args.queue_size, block=True)
+    change_detector = None
+    if args.skip_threshold is not None:
+        change_detector = ChangeDetector(args.skip_threshold)
+    pipeline = VideoPipeline(video_cap,
+                             lambda frames: convert_frames(model, frames, size),
+                             video_out=video_out,
+                             batch_size=args.batch_size,
+                             display=False,
+                             change_detector=change_detector)
+
+    start = time.perf_counter()
+    pipeline.start()
+    try:
+        while pipeline.running:
+            pipeline.join(timeout=1)
+            elapsed = time.perf_counter() - start
+            print(f"\r{pipeline.frames_converted}/{video_cap.frame_counts} frames, "
+                  f"{pipeline.frames_converted / elapsed:.1f} fps, "
+                  f"encode queue {video_out.queue_depth}/{args.queue_size}",
+                  end="",
+                  file=sys.stderr)
+    except KeyboardInterrupt:
+        pipeline.stop()
+        pipeline.join()
+    print(file=sys.stderr)
+
+    if pipeline.error is not None:
+        print(f"Render failed: {pipeline.error}", file=sys.stderr)
+        return 1
+
+    elapsed = time.perf_counter() - start
+    fps = pipeline.frames_converted / elapsed
+    realtime = fps / video_cap.fps if video_cap.fps else float("nan")
+    print(f"Rendered {pipeline.frames_converted} frames to {args.output} in "
+          f"{elapsed:.2f}s: {fps:.1f} fps vs {video_cap.fps:.1f} fps source "
+          f"({realtime:.2f}x realtime, batch size {args.batch_size})")
+    if args.native:
+        for bucket, stats in model.report().items():
+            print(f"Bucket {bucket}: {stats['calls']} calls, "
+                  f"p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms")
+    if change_detector is not None:
+        print(f"Skipped {change_detector.skipped} unchanged frames "
+              f"({change_detector.skip_rate:.0%}), "
+              f"{fps * (1 - change_detector.skip_rate):.1f} generator passes/s")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert a video with the CycleGAN generator without a GUI")
+    parser.add_argument("input", help="source video")
+    parser.add_argument("-o", "--output", default="output.avi")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="frames per generator call")
+    parser.add_argument("--codec", default=None,
+                        help="fourcc, by default picked from the output "
+                             f"extension: {CODECS}")
+    parser.add_argument("--upscale", action="store_true",
+                        help="write frames at the source resolution instead "
+                             "of 256x256")
+    parser.add_argument("--queue-size", type=int, default=32,
+                        help="frames buffered ahead of the encoder")
+    parser.add_argument("--skip-threshold", type=float, default=None,
+                        help="reuse the previous output for frames whose "
+                             "mean abs difference (0-255, on a 32x32 "
+                             "thumbnail) is below this, e.g. 2")
+    parser.add_argument("--native", action="store_true",
+                        help="convert near the source resolution, padded to "
+                             "multiples of 256, instead of at 256x256")
+    parser.add_argument("--max-side", type=int, default=1024,
+                        help="longest side for --native")
+    parser.add_argument("--model", default="gen_f.h5",
+                        help="keras model, MODEL_BACKEND selects tflite instead")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(render(parse_args()))
@@ -0,0 +1,250 @@
+import queue
+import threading
+from contextlib import nullcontext
+import numpy as np
+import tensorflow as tf
+import cv2
+
+_END = object()
+
+
+class VideoCapture:
+    def __init__(self, source):
+        self.video_cap = cv2.VideoCapture(source)
+        if not self.video_cap.isOpened():
+            raise ValueError("Unable to open video source", source)
+        self.width = int(self.video_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.video_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.video_cap.get(cv2.CAP_PROP_FPS)
+        self.frame_counts = int(self.video_cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_num = 0
+
+    def get_frame(self):
+        if self.video_cap.isOpened():
+            ret, frame = self.video_cap.read()
+            if ret:
+                self.frame_num += 1
+                return (ret, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB),
+                        self.width, self.height)
+            else:
+                return (ret, None, self.width, self.height)
+        else:
+            raise ValueError("Unable to open video to get frame",)
+
+    def rewind(self):
+        self.video_cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.frame_num = 0
+
+    def __del__(self):
+        if self.video_cap and self.video_cap.isOpened():
+            self.video_cap.release()
+
+
+def _stage(instrument, name):
+    return nullcontext() if instrument is None else instrument.stage(name)
+
+
+def convert_frames(model, frames, size=(256, 256), instrument=None):
+    """
+    Runs the generator on a (N, H, W, 3) uint8 batch of RGB frames and
+    returns a (N, size[0], size[1], 3) uint8 batch. model is a
+    CompiledGenerator, or a BucketedGenerator for sizes other than 256x256
+    """
+    with _stage(instrument, "preprocess"):
+        input_img = tf.cast(frames, tf.float32)
+        input_img = (input_img - 127.5) / 127.5
+        input_img = tf.image.resize(input_img, size)
+
+    with _stage(instrument, "inference"):
+        output_img = np.asarray(model(input_img))
+
+    with _stage(instrument, "postprocess"):
+        output_img = output_img * 127.5 + 127.5
+        output_img = output_img.astype(np.uint8)
+
+    return output_img
+
+
+class VideoPipeline:
+    """
+    Runs decode and inference on their own threads connected by a bounded
+    queue and hands converted frames to video_out, a VideoWriterThread
+    encoding on a third thread, so a video converts at the speed of the
+    slowest stage.
+    Converted frames are also published to a small display queue that drops
+    the oldest frame when the GUI falls behind, so display never paces the
+    conversion.
+
+    convert_fn maps a (N, H, W, 3) uint8 batch of frames to a batch of
+    converted frames, N being at most batch_size. With a change_detector,
+    frames it reports as unchanged reuse the previous converted frame
+    instead of going through convert_fn
+    """
+
+    def __init__(self, video_cap, convert_fn, video_out=None, batch_size=1,
+                 queue_size=8, display_size=2, display=True,
+                 change_detector=None, instrument=None):
+        self.video_cap = video_cap
+        self.instrument = instrument
+        self.convert_fn = convert_fn
+        self.change_detector = change_detector
+        self._last_output = None
+        self.video_out = video_out
+        self.batch_size = batch_size
+        self.display = display
+        self.decode_q = queue.Queue(queue_size)
+        self.display_q = queue.Queue(display_size)
+        self.stop_event = threading.Event()
+        self.frames_converted = 0
+        self.frames_not_displayed = 0
+        self.error = None
+
+        self.threads = [threading.Thread(target=self._decode_loop, daemon=True),
+                        threading.Thread(target=self._infer_loop, daemon=True)]
+        if video_out is not None:
+            video_out.on_error = self._fail
+            self.threads.append(video_out)
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def shutdown(self, timeout=1):
+        """
+        Stops the pipeline, waiting at most timeout for decode and inference
+        but for as long as the writer needs to encode its queued frames and
+        release the file, so the output is never left unfinished
+        """
+        self.stop()
+        for thread in self.threads[:2]:
+            thread.join(timeout)
+        if self.video_out is not None:
+            self.video_out.close()
+            self.video_out.join()
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def finished(self):
+        return not self.running and self.display_q.empty()
+
+    def latest_frame(self):
+        """
+        Returns the newest (frame_num, frame, converted) tuple published
+        since the last call, or None
+        """
+        item = None
+        while True:
+            try:
+                item = self.display_q.get_nowait()
+            except queue.Empty:
+                return item
+
+    @property
+    def frames_skipped(self):
+        if self.change_detector is None:
+            return 0
+        return self.change_detector.skipped
+
+    def _fail(self, error):
+        self.error = error
+        self.stop_event.set()
+
+    def _put(self, q, item):
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _publish(self, item):
+        while True:
+            try:
+                self.display_q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.display_q.get_nowait()
+                    self.frames_not_displayed += 1
+                except queue.Empty:
+                    pass
+
+    def _decode_loop(self):
+        try:
+            while not self.stop_event.is_set():
+                with _stage(self.instrument, "decode"):
+                    ret, frame, _, _ = self.video_cap.get_frame()
+                if not ret:
+                    break
+                if not self._put(self.decode_q, (self.video_cap.frame_num, frame)):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.decode_q, _END)
+
+    def _convert(self, frames):
+        """
+        Converts the changed frames of a batch in one call and repeats the
+        last converted frame for the unchanged ones
+        """
+        if self.change_detector is None:
+            return self.convert_fn(np.stack(frames))
+
+        changed = [self.change_detector.changed(frame) for frame in frames]
+        converted = iter(())
+        if any(changed):
+            converted = iter(self.convert_fn(np.stack(
+                [frame for frame, c in zip(frames, changed) if c])))
+        outputs = []
+        for c in changed:
+            if c:
+                self._last_output = next(converted)
+            outputs.append(self._last_output)
+        return outputs
+
+    def _infer_loop(self):
+        try:
+            end = False
+            while not end:
+                batch = []
+                while len(batch) < self.batch_size:
+                    item = self._get(self.decode_q)
+                    if item is _END:
+                        end = True
+                        break
+                    batch.append(item)
+                if not batch:
+                    break
+
+                paint_frames = self._convert([f for _, f in batch])
+                for (frame_num, frame), paint_frame in zip(batch, paint_frames):
+                    self.frames_converted += 1
+                    if self.video_out is not None:
+                        self.video_out.write(paint_frame)
+                    if self.display:
+                        self._publish((frame_num, frame, paint_frame))
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if self.video_out is not None:
+                self.video_out.close()
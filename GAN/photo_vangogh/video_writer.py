@@ -0,0 +1,113 @@
+import os
+import queue
+import threading
+import cv2
+
+_END = object()
+
+# fourcc used for each container when no codec is given
+CODECS = {".avi": "DIVX", ".mp4": "mp4v", ".mkv": "XVID", ".mov": "mp4v"}
+
+
+def default_codec(path):
+    return CODECS.get(os.path.splitext(path)[1].lower(), "DIVX")
+
+
+class VideoWriterThread:
+    """
+    Encodes RGB frames on its own thread behind a bounded queue.
+
+    With block=True a full queue makes write() wait, which paces the
+    producer to the encoder so every frame reaches the file. With
+    block=False a full queue drops the frame instead, which only suits
+    outputs where losing frames is acceptable. Frames are resized to output_size when it differs from the
+    converted frame size, e.g. back up to the source resolution
+    """
+
+    def __init__(self, path, fps, output_size=(256, 256), codec=None,
+                 queue_size=32, block=True, on_error=None):
+        self.path = path
+        self.codec = codec or default_codec(path)
+        self.output_size = tuple(output_size)
+        self.block = block
+        self.on_error = on_error
+        self.queue_size = queue_size
+
+        self.video_out = cv2.VideoWriter(path,
+                                         fourcc=cv2.VideoWriter_fourcc(*self.codec),
+                                         fps=fps,
+                                         frameSize=self.output_size)
+        if not self.video_out.isOpened():
+            raise ValueError(f"Unable to open {path} for writing with codec "
+                             f"{self.codec}")
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.error = None
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def write(self, frame):
+        """
+        Queues one (H, W, 3) uint8 RGB frame. Returns False when the frame
+        was dropped or the writer has failed
+        """
+        if self.error is not None or self._closed:
+            return False
+        if self.block:
+            self._queue.put(frame)
+            return True
+        try:
+            self._queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def close(self):
+        """
+        Lets the queued frames finish encoding, then releases the file.
+        Calls after the first do nothing
+        """
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(_END)
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def _run(self):
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is _END:
+                    break
+                if frame.shape[1::-1] != self.output_size:
+                    frame = cv2.resize(frame, self.output_size,
+                                       interpolation=cv2.INTER_CUBIC)
+                self.video_out.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+                self.frames_written += 1
+        except Exception as e:
+            self.error = e
+            if self.on_error is not None:
+                self.on_error(e)
+            # keep draining so blocked producers and close() return
+            while self._queue.get() is not _END:
+                pass
+        finally:
+            self.video_out.release()
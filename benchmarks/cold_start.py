@@ -0,0 +1,82 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+import numpy as np
+from common.models import PRECOMPILABLE, ROOT
+
+FORMATS = ("keras", "precompiled")
+
+# run in a fresh interpreter so imports, loading and tracing are all cold
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import tensorflow as tf
+from common.models import load_runtime_model
+imported = time.perf_counter()
+model = load_runtime_model({name!r}, training={training!r}, backend="keras",
+                           precompiled={precompiled!r})
+loaded = time.perf_counter()
+output = model(tf.zeros((1, 256, 256, 3)))
+getattr(output, "numpy", lambda: output)()
+done = time.perf_counter()
+print(json.dumps({{"import_s": imported - start, "load_s": loaded - imported,
+                  "first_result_s": done - loaded, "type": type(model).__name__}}))
+"""
+
+
+def cold_start(name, fmt, training=False):
+    """
+    Seconds from process start to the first result, measured from the
+    parent, plus the child's own breakdown
+    """
+    code = CHILD.format(name=name, training=training,
+                        precompiled=fmt == "precompiled")
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    total = time.perf_counter() - start
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats["total_s"] = total
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Process start to first result with the Keras files and "
+                    "the precompiled SavedModels")
+    parser.add_argument("models", nargs="*",
+                        help=f"any of {', '.join(PRECOMPILABLE)}, all by default")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("-o", "--output", default=None, help="json results")
+    args = parser.parse_args(argv)
+    for name in args.models:
+        if name not in PRECOMPILABLE:
+            parser.error(f"unknown model {name}")
+
+    report = {}
+    for name in args.models or PRECOMPILABLE:
+        report[name] = {}
+        for fmt in FORMATS:
+            runs = [cold_start(name, fmt) for _ in range(args.runs)]
+            if fmt == "precompiled" and runs[0]["type"] != "PrecompiledModel":
+                print(f"{name}: no precompiled model, run "
+                      f"python -m common.precompile {name}", file=sys.stderr)
+            report[name][fmt] = {
+                key: float(np.median([run[key] for run in runs]))
+                for key in ("total_s", "import_s", "load_s", "first_result_s")}
+            stats = report[name][fmt]
+            print(f"{name:12s} {fmt:12s} total {stats['total_s']:6.2f}s  "
+                  f"import {stats['import_s']:5.2f}s  "
+                  f"load {stats['load_s']:5.2f}s  "
+                  f"first result {stats['first_result_s']:5.2f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import argparse
+import json
+import sys
+import numpy as np
+import tensorflow as tf
+from common.compiled import measure_latency
+from common.decode import MEAN_ABS_TOLERANCE, dct_ratio, decode_resized
+
+SIZES = ((1920, 1080), (4032, 3024), (5472, 3648))
+
+
+def full_decode(data, size=(256, 256)):
+    """
+    The original get_input_data path: full decode, float conversion and
+    normalisation at full resolution, then the resize
+    """
+    img = tf.io.decode_jpeg(data, 3)
+    img = tf.cast(img, tf.float32)
+    img = (img - 127.5) / 127.5
+    return tf.image.resize(img, size)
+
+
+def reduced_decode(data, size=(256, 256)):
+    return (decode_resized(data, size) - 127.5) / 127.5
+
+
+def synthetic_photo(width, height, seed=0):
+    """
+    Smooth shapes with fine grain on top, encoded like a camera jpeg
+    """
+    rng = np.random.default_rng(seed)
+    coarse = rng.uniform(0, 255, (height // 64 + 2, width // 64 + 2, 3))
+    coarse = coarse.astype(np.float32)
+    img = tf.image.resize(coarse[None], (height, width), method="bicubic")[0]
+    img += rng.normal(0, 8, (height, width, 3)).astype(np.float32)
+    img = tf.cast(tf.clip_by_value(img, 0, 255), tf.uint8)
+    return tf.io.encode_jpeg(img, quality=92)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Full vs reduced-resolution jpeg decode to 256x256")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("-o", "--output", default=None, help="json results")
+    args = parser.parse_args(argv)
+
+    report = {"tolerance": MEAN_ABS_TOLERANCE, "sizes": {}}
+    for width, height in SIZES:
+        data = synthetic_photo(width, height)
+        reference = full_decode(data).numpy()
+        reduced = reduced_decode(data).numpy()
+        diff = np.abs(reduced - reference)
+
+        key = f"{width}x{height}"
+        report["sizes"][key] = {
+            "dct_ratio": dct_ratio(height, width, (256, 256)),
+            "full": measure_latency(full_decode, data, runs=args.runs),
+            "reduced": measure_latency(reduced_decode, data, runs=args.runs),
+            "mean_abs_diff": float(diff.mean()),
+            "max_abs_diff": float(diff.max()),
+            "within_tolerance": bool(diff.mean() <= MEAN_ABS_TOLERANCE),
+        }
+
+        stats = report["sizes"][key]
+        print(f"{key:10s} 1/{stats['dct_ratio']}  "
+              f"full {stats['full']['p50_ms']:8.2f} ms  "
+              f"reduced {stats['reduced']['p50_ms']:8.2f} ms  "
+              f"mean diff {stats['mean_abs_diff']:.4f}"
+              f"{'' if stats['within_tolerance'] else '  OUT OF TOLERANCE'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if all(s["within_tolerance"] for s in report["sizes"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
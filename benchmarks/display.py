@@ -0,0 +1,151 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import tkinter as tk
+import numpy as np
+import cv2
+from PIL import Image, ImageTk
+from common.models import ROOT
+
+vangogh_dir = os.path.join(ROOT, "GAN", "photo_vangogh")
+if vangogh_dir not in sys.path:
+    sys.path.append(vangogh_dir)
+from frame_view import FrameView
+
+
+class LegacyView:
+    """
+    The display path app_video.py used before FrameView: new resize
+    output, PIL image, PhotoImage and canvas item for every frame
+    """
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.photo = None
+
+    def render(self, frame, size):
+        frame_resized = cv2.resize(frame, size)
+        return Image.fromarray(frame_resized)
+
+    def show(self, frame, size):
+        img = self.render(frame, size)
+        self.photo = ImageTk.PhotoImage(image=img)
+        self.canvas.configure(width=size[0], height=size[1])
+        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+
+
+def gc_collections():
+    return sum(stats["collections"] for stats in gc.get_stats())
+
+
+def measure(step, frames, warmup, settle=None):
+    for frame in frames[:warmup]:
+        step(frame)
+        if settle is not None:
+            settle()
+
+    times = []
+    collections = gc_collections()
+    tracemalloc.start()
+    for frame in frames[warmup:]:
+        start = time.perf_counter()
+        step(frame)
+        times.append(time.perf_counter() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    collections = gc_collections() - collections
+
+    n = len(times)
+    return {"p50_ms": float(np.percentile(times, 50) * 1000),
+            "p95_ms": float(np.percentile(times, 95) * 1000),
+            "mean_ms": float(np.mean(times) * 1000),
+            "traced_peak_kb": peak / 1024,
+            "gc_collections_per_100_frames": collections * 100 / n}
+
+
+def run_view(root, view_class, frames, size, warmup):
+    canvas = tk.Canvas(root)
+    canvas.pack()
+    view = view_class(canvas)
+
+    def step(frame):
+        view.show(frame, size)
+        root.update_idletasks()
+
+    stats = measure(step, frames, warmup, settle=root.update)
+    stats["canvas_items"] = len(canvas.find_all())
+    canvas.destroy()
+    return stats
+
+
+def run_render(view_class, frames, size, warmup):
+    """
+    Only the resize and PIL image part of the display stage, which runs
+    without a Tk window
+    """
+    view = view_class(None)
+    return measure(lambda frame: view.render(frame, size), frames, warmup)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Display-stage cost of app_video.py with the old "
+                    "per-frame allocations and with FrameView. Needs a "
+                    "display, e.g. under xvfb-run, unless --no-tk")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--source-size", type=int, nargs=2,
+                        default=(1280, 720), metavar=("W", "H"))
+    parser.add_argument("--display-size", type=int, nargs=2,
+                        default=(600, 337), metavar=("W", "H"))
+    parser.add_argument("--no-tk", action="store_true",
+                        help="time only the resize and PIL image, without "
+                             "the PhotoImage and canvas")
+    parser.add_argument("-o", "--output", default=None, help="json results")
+    args = parser.parse_args(argv)
+
+    root = None
+    if not args.no_tk:
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:
+            print(f"Cannot open a Tk window: {e}", file=sys.stderr)
+            return 1
+
+    rng = np.random.default_rng(0)
+    w, h = args.source_size
+    # a few distinct frames cycled, so the frames themselves are not
+    # allocated inside the timed loop
+    pool = [rng.integers(0, 256, (h, w, 3), np.uint8) for _ in range(8)]
+    frames = [pool[i % len(pool)] for i in range(args.warmup + args.frames)]
+    size = tuple(args.display_size)
+
+    report = {}
+    for name, view_class in (("legacy", LegacyView), ("frame_view", FrameView)):
+        if root is None:
+            stats = run_render(view_class, frames, size, args.warmup)
+        else:
+            stats = run_view(root, view_class, frames, size, args.warmup)
+        report[name] = stats
+        line = (f"{name:10s} p50 {stats['p50_ms']:6.2f} ms  "
+                f"p95 {stats['p95_ms']:6.2f} ms  "
+                f"traced peak {stats['traced_peak_kb']:8.0f} KB  "
+                f"gc {stats['gc_collections_per_100_frames']:5.1f} / 100 frames")
+        if "canvas_items" in stats:
+            line += f"  canvas items {stats['canvas_items']}"
+        print(line)
+    if root is not None:
+        root.destroy()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import argparse
+import json
+import sys
+import numpy as np
+import tensorflow as tf
+from common.compiled import measure_latency
+from common.models import MODEL_PATHS, get_custom_objects
+from benchmarks.stand_ins import unet_generator
+
+# activation shapes the CycleGAN U-Net normalizes at 256x256
+SHAPES = ((1, 64, 64, 256), (1, 32, 32, 512), (1, 128, 128, 128),
+          (1, 64, 64, 512), (1, 128, 128, 256))
+
+
+def reference_layer_class():
+    InstanceNormalization = get_custom_objects("vangogh")[
+        "CycleGAN>InstanceNormalization"]
+    from instance_norm import instance_norm_reference
+
+    class ReferenceInstanceNormalization(InstanceNormalization):
+        def call(self, x):
+            return instance_norm_reference(x, self.scale, self.offset,
+                                           self.epsilon)
+
+    return InstanceNormalization, ReferenceInstanceNormalization
+
+
+def micro_benchmark(runs, batch_size):
+    get_custom_objects("vangogh")  # puts instance_norm on sys.path
+    from instance_norm import instance_norm, instance_norm_reference
+
+    results = {}
+    for shape in SHAPES:
+        shape = (batch_size,) + shape[1:]
+        x = tf.random.normal(shape, 1.0, 3.0)
+        scale = tf.random.normal(shape[-1:], 1.0, 0.02)
+        offset = tf.random.normal(shape[-1:], 0.0, 0.1)
+        fused = tf.function(lambda x: instance_norm(x, scale, offset))
+        reference = tf.function(
+            lambda x: instance_norm_reference(x, scale, offset))
+
+        key = "x".join(str(d) for d in shape)
+        results[key] = {
+            "reference": measure_latency(reference, x, runs=runs),
+            "fused": measure_latency(fused, x, runs=runs),
+            "max_abs_diff": float(np.abs(fused(x) - reference(x)).max()),
+        }
+    return results
+
+
+def generators():
+    """
+    The same generator built with the reference and the fused layer and
+    sharing weights, from gen_f.h5 when it can be loaded
+    """
+    fused_cls, reference_cls = reference_layer_class()
+    try:
+        fused = tf.keras.models.load_model(
+            MODEL_PATHS["vangogh"], compile=False,
+            custom_objects={"CycleGAN>InstanceNormalization": fused_cls})
+        reference = tf.keras.models.load_model(
+            MODEL_PATHS["vangogh"], compile=False,
+            custom_objects={"CycleGAN>InstanceNormalization": reference_cls})
+    except Exception as e:
+        print(f"Using a stand-in generator ({e})", file=sys.stderr)
+        fused = unet_generator(fused_cls)
+        reference = unet_generator(reference_cls)
+        reference.set_weights(fused.get_weights())
+    return reference, fused
+
+
+def generator_benchmark(runs, batch_size):
+    from common.compiled import CompiledGenerator
+
+    reference, fused = generators()
+    x = tf.random.uniform((batch_size, 256, 256, 3), -1, 1)
+    results = {}
+    outputs = {}
+    for label, model in (("reference", reference), ("fused", fused)):
+        generator = CompiledGenerator(model)
+        outputs[label] = generator(x).numpy()
+        results[label] = measure_latency(generator, x, runs=runs)
+    results["max_abs_diff"] = float(
+        np.abs(outputs["fused"] - outputs["reference"]).max())
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fused vs reference InstanceNormalization latency")
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("-o", "--output", default=None, help="json results")
+    args = parser.parse_args(argv)
+
+    report = {"layer": micro_benchmark(args.runs, args.batch_size),
+              "generator": generator_benchmark(args.runs, args.batch_size)}
+
+    for shape, stats in report["layer"].items():
+        print(f"{shape:18s} reference {stats['reference']['p50_ms']:8.3f} ms  "
+              f"fused {stats['fused']['p50_ms']:8.3f} ms  "
+              f"max diff {stats['max_abs_diff']:.2e}")
+    stats = report["generator"]
+    print(f"{'generator':18s} reference {stats['reference']['p50_ms']:8.3f} ms  "
+          f"fused {stats['fused']['p50_ms']:8.3f} ms  "
+          f"max diff {stats['max_abs_diff']:.2e}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+import tensorflow as tf
+import cv2
+from common.compiled import CompiledGenerator
+from common.decode import decode_resized
+from common.instrument import Instrument
+from common.models import ROOT
+from benchmarks.stand_ins import stand_in
+
+STAGES = ("decode", "preprocess", "inference", "postprocess", "total")
+
+
+def load_app_module(relpath, name):
+    """
+    Imports an app script under a unique module name with its own directory
+    on sys.path, since every app is a sibling-importing app.py
+    """
+    path = os.path.join(ROOT, relpath)
+    app_dir = os.path.dirname(path)
+    if app_dir in sys.path:
+        sys.path.remove(app_dir)
+    sys.path.insert(0, app_dir)
+    # sibling modules such as preprocess or tiling are not shared between apps
+    for sibling in ("app", "preprocess", "tiling", "live"):
+        sys.modules.pop(sibling, None)
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def headless(app_class, **attrs):
+    """
+    An App instance that never creates its Tk window, with just the
+    attributes its inference methods read
+    """
+    app = app_class.__new__(app_class)
+    app.__dict__.update(attrs)
+    return app
+
+
+def _sync(result):
+    if hasattr(result, "numpy"):
+        result.numpy()
+    return result
+
+
+class Timed:
+    """
+    Callable proxy that accumulates the wall time spent in the wrapped
+    callable and in its predict method
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.elapsed = 0.0
+
+    def _timed(self, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = _sync(fn(*args, **kwargs))
+        self.elapsed += time.perf_counter() - start
+        return result
+
+    def __call__(self, *args, **kwargs):
+        return self._timed(self.fn, *args, **kwargs)
+
+    def predict(self, *args, **kwargs):
+        return self._timed(self.fn.predict, *args, **kwargs)
+
+    def reset(self):
+        self.elapsed = 0.0
+
+
+def synthetic_jpeg(path, size, brain=False, seed=0):
+    rng = np.random.default_rng(seed)
+    w, h = size
+    if brain:
+        img = np.zeros((h, w, 3), np.uint8)
+        cv2.ellipse(img, (w // 2, h // 2), (w // 3, h // 2 - h // 10), 0, 0, 360,
+                    (140, 140, 140), -1)
+        img = cv2.add(img, rng.integers(0, 40, img.shape, dtype=np.uint8))
+    else:
+        small = rng.integers(0, 256, (h // 16 + 1, w // 16 + 1, 3), dtype=np.uint8)
+        img = cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+        img = cv2.add(img, rng.integers(0, 20, img.shape, dtype=np.uint8))
+    cv2.imwrite(path, img)
+    return path
+
+
+def summarize(samples):
+    return {stage: {"p50_ms": float(np.percentile(times, 50) * 1000),
+                    "p95_ms": float(np.percentile(times, 95) * 1000),
+                    "mean_ms": float(np.mean(times) * 1000)}
+            for stage, times in samples.items() if times}
+
+
+def run_app(timed_model, decode_fn, get_input, infer, iterations, warmup):
+    """
+    Times one app path. decode is measured on its own, preprocess is the rest
+    of get_input_data, inference is the time inside the model and
+    postprocess what remains of the full call
+    """
+    samples = {stage: [] for stage in STAGES}
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        _sync(decode_fn())
+        decode = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _sync(get_input())
+        input_time = time.perf_counter() - start
+
+        timed_model.reset()
+        start = time.perf_counter()
+        _sync(infer())
+        total = time.perf_counter() - start
+
+        if i < warmup:
+            continue
+        samples["decode"].append(decode)
+        samples["preprocess"].append(max(input_time - decode, 0.0))
+        samples["inference"].append(timed_model.elapsed)
+        samples["postprocess"].append(max(total - input_time - timed_model.elapsed, 0.0))
+        samples["total"].append(total)
+    return summarize(samples)
+
+
+def bench_gan_app(relpath, name, model_name, training, image_path, args):
+    module = load_app_module(relpath, name)
+    model = Timed(CompiledGenerator(stand_in(model_name), training=training))
+    # native is only read by the vangogh app, at its 256x256 default
+    app = headless(module.App, model=model, image_size=(256, 256),
+                   native=False, instrument=Instrument(name, log_path=""))
+    # the scaled decode and the resize happen in one step for the GAN apps
+    return run_app(model,
+                   lambda: decode_resized(tf.io.read_file(image_path),
+                                          app.image_size),
+                   lambda: app.get_input_data(image_path),
+                   lambda: app.tf_convert_image(image_path),
+                   args.iterations, args.warmup)
+
+
+def bench_enhance(image_path, args):
+    module = load_app_module(os.path.join("GAN", "photo_enhance", "app.py"),
+                             "enhance_app")
+    model = Timed(stand_in("esrgan", esrgan_blocks=args.esrgan_blocks))
+    app = headless(module.App, model=model, tile_size=args.tile_size,
+                   tile_overlap=16, tile_batch_size=4,
+                   instrument=Instrument("enhance", log_path=""))
+    return run_app(model,
+                   lambda: tf.image.decode_image(tf.io.read_file(image_path)),
+                   lambda: app.get_input_data(image_path),
+                   lambda: app.tf_enhance_image(image_path),
+                   args.iterations, args.warmup)
+
+
+def bench_tumor(image_path, args):
+    module = load_app_module(os.path.join("CNN", "brain_tumor", "app.py"),
+                             "tumor_app")
+    model = Timed(stand_in("brain_tumor"))
+    app = headless(module.App, model=model, model_image_size=(256, 256),
+                   instrument=Instrument("brain_tumor", log_path=""))
+    results = run_app(model,
+                      lambda: tf.io.decode_jpeg(tf.io.read_file(image_path), 3),
+                      lambda: app.get_input_data(image_path),
+                      lambda: app.tf_detect_tumor(image_path),
+                      args.iterations, args.warmup)
+
+    img = tf.io.decode_jpeg(tf.io.read_file(image_path), 3).numpy()
+    crop_times = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        app.crop_img(img, image_size=(256, 256))
+        crop_times.append(time.perf_counter() - start)
+    results.update(summarize({"crop_img": crop_times}))
+    return results
+
+
+def bench_live(relpath, name, model_name, training, args):
+    module = load_app_module(relpath, name)
+    model = Timed(CompiledGenerator(stand_in(model_name), training=training))
+    frame = cv2.imread(synthetic_jpeg(os.path.join(args.workdir, "frame.jpg"),
+                                      (640, 480)))
+    encoded = cv2.imencode(".jpg", frame)[1]
+
+    samples = {stage: [] for stage in STAGES}
+    for i in range(args.warmup + args.iterations):
+        # webcams deliver MJPEG, so a jpeg decode stands in for cap.read()
+        t0 = time.perf_counter()
+        frame = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+        t1 = time.perf_counter()
+        input_img = _sync(module.preprocess_frame(frame))
+        t2 = time.perf_counter()
+        output = model(input_img)
+        t3 = time.perf_counter()
+        module.postprocess_output(output)
+        t4 = time.perf_counter()
+
+        if i < args.warmup:
+            continue
+        for stage, elapsed in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t4 - t0)):
+            samples[stage].append(elapsed)
+    return summarize(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Per-stage latency of every app on synthetic inputs")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(1024, 768),
+                        metavar=("W", "H"))
+    parser.add_argument("--enhance-size", type=int, nargs=2, default=(256, 256),
+                        metavar=("W", "H"))
+    parser.add_argument("--tile-size", type=int, default=256)
+    parser.add_argument("--esrgan-blocks", type=int, default=23)
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="subset of benchmarks to run")
+    parser.add_argument("-o", "--output", default=None,
+                        help="json results path, timestamped by default")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        args.workdir = workdir
+        photo = synthetic_jpeg(os.path.join(workdir, "photo.jpg"),
+                               tuple(args.image_size))
+        small = synthetic_jpeg(os.path.join(workdir, "small.jpg"),
+                               tuple(args.enhance_size), seed=1)
+        mri = synthetic_jpeg(os.path.join(workdir, "mri.jpg"), (512, 512),
+                             brain=True, seed=2)
+
+        benches = {
+            "facades_app": lambda: bench_gan_app(
+                os.path.join("GAN", "facades", "app.py"), "facades_app",
+                "facades", True, photo, args),
+            "vangogh_app": lambda: bench_gan_app(
+                os.path.join("GAN", "photo_vangogh", "app.py"), "vangogh_app",
+                "vangogh", False, photo, args),
+            "enhance_app": lambda: bench_enhance(small, args),
+            "brain_tumor_app": lambda: bench_tumor(mri, args),
+            "facades_live": lambda: bench_live(
+                os.path.join("GAN", "facades", "live.py"), "facades_live",
+                "facades", True, args),
+            "vangogh_live": lambda: bench_live(
+                os.path.join("GAN", "photo_vangogh", "live.py"), "vangogh_live",
+                "vangogh", False, args),
+        }
+
+        results = {}
+        for name, bench in benches.items():
+            if args.only and name not in args.only:
+                continue
+            print(f"Running {name}", file=sys.stderr)
+            results[name] = bench()
+            for stage, stats in results[name].items():
+                print(f"  {stage:12s} p50 {stats['p50_ms']:9.2f} ms  "
+                      f"p95 {stats['p95_ms']:9.2f} ms", file=sys.stderr)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "tensorflow": tf.__version__,
+        "gpus": len(tf.config.list_physical_devices("GPU")),
+        "iterations": args.iterations,
+        "results": results,
+    }
+    output = args.output or time.strftime("benchmark_%Y%m%d-%H%M%S.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import sys
+import tensorflow as tf
+from common.models import get_custom_objects, load_model
+
+layers = tf.keras.layers
+
+
+def _downsample(filters, size, norm_layer=None):
+    init = tf.random_normal_initializer(0., 0.02)
+    result = tf.keras.Sequential()
+    result.add(layers.Conv2D(filters, size, strides=2, padding="same",
+                             kernel_initializer=init, use_bias=False))
+    if norm_layer is not None:
+        result.add(norm_layer())
+    result.add(layers.LeakyReLU())
+    return result
+
+
+def _upsample(filters, size, norm_layer, apply_dropout=False):
+    init = tf.random_normal_initializer(0., 0.02)
+    result = tf.keras.Sequential()
+    result.add(layers.Conv2DTranspose(filters, size, strides=2, padding="same",
+                                      kernel_initializer=init, use_bias=False))
+    result.add(norm_layer())
+    if apply_dropout:
+        result.add(layers.Dropout(0.5))
+    result.add(layers.ReLU())
+    return result
+
+
+def unet_generator(norm_layer):
+    """
+    The pix2pix U-Net generator, also used by the CycleGAN tutorial with
+    instance normalization
+    """
+    down_stack = [_downsample(64, 4)] + [
+        _downsample(f, 4, norm_layer) for f in (128, 256, 512, 512, 512, 512, 512)]
+    up_stack = [_upsample(512, 4, norm_layer, apply_dropout=True)
+                for _ in range(3)] + [
+        _upsample(f, 4, norm_layer) for f in (512, 256, 128, 64)]
+    last = layers.Conv2DTranspose(3, 4, strides=2, padding="same",
+                                  kernel_initializer=tf.random_normal_initializer(0., 0.02),
+                                  activation="tanh")
+
+    inputs = layers.Input(shape=[256, 256, 3])
+    x = inputs
+    skips = []
+    for down in down_stack:
+        x = down(x)
+        skips.append(x)
+    for up, skip in zip(up_stack, reversed(skips[:-1])):
+        x = up(x)
+        x = layers.Concatenate()([x, skip])
+    return tf.keras.Model(inputs=inputs, outputs=last(x))
+
+
+def _dense_block(x, filters, growth):
+    features = [x]
+    for _ in range(4):
+        y = layers.Conv2D(growth, 3, padding="same")(
+            features[0] if len(features) == 1 else layers.Concatenate()(features))
+        features.append(layers.LeakyReLU(0.2)(y))
+    y = layers.Conv2D(filters, 3, padding="same")(layers.Concatenate()(features))
+    return layers.Add()([x, layers.Rescaling(0.2)(y)])
+
+
+def rrdb_net(blocks=23, filters=64, growth=32):
+    """
+    ESRGAN's RRDBNet: residual-in-residual dense blocks and two x2
+    nearest-neighbour upsampling stages
+    """
+    inputs = layers.Input(shape=[None, None, 3])
+    fea = layers.Conv2D(filters, 3, padding="same")(inputs)
+    x = fea
+    for _ in range(blocks):
+        y = x
+        for _ in range(3):
+            y = _dense_block(y, filters, growth)
+        x = layers.Add()([x, layers.Rescaling(0.2)(y)])
+    x = layers.Conv2D(filters, 3, padding="same")(x)
+    x = layers.Add()([fea, x])
+    for _ in range(2):
+        x = layers.UpSampling2D(2, interpolation="nearest")(x)
+        x = layers.LeakyReLU(0.2)(layers.Conv2D(filters, 3, padding="same")(x))
+    x = layers.LeakyReLU(0.2)(layers.Conv2D(filters, 3, padding="same")(x))
+    return tf.keras.Model(inputs=inputs,
+                          outputs=layers.Conv2D(3, 3, padding="same")(x))
+
+
+def tumor_classifier(num_classes=4):
+    inputs = layers.Input(shape=[256, 256, 3])
+    x = layers.Rescaling(1. / 255)(inputs)
+    for filters in (32, 64, 128, 128):
+        x = layers.Conv2D(filters, 3, padding="same", activation="relu")(x)
+        x = layers.MaxPooling2D()(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dense(128, activation="relu")(x)
+    return tf.keras.Model(inputs=inputs,
+                          outputs=layers.Dense(num_classes, activation="softmax")(x))
+
+
+def stand_in(name, esrgan_blocks=23):
+    """
+    A randomly initialised model with the architecture of the shipped one.
+    The shipped Keras models are cloned when their files are available,
+    otherwise the reference architecture is built from scratch
+    """
+    if name != "esrgan":
+        try:
+            return tf.keras.models.clone_model(load_model(name))
+        except Exception as e:
+            print(f"Building {name} stand-in from scratch ({e})",
+                  file=sys.stderr)
+
+    if name == "facades":
+        return unet_generator(layers.BatchNormalization)
+    if name == "vangogh":
+        return unet_generator(
+            get_custom_objects("vangogh")["CycleGAN>InstanceNormalization"])
+    if name == "esrgan":
+        return rrdb_net(blocks=esrgan_blocks)
+    if name == "brain_tumor":
+        return tumor_classifier()
+    raise ValueError(f"Unknown model {name}")
@@ -0,0 +1,105 @@
+import threading
+import time
+import numpy as np
+import tensorflow as tf
+from common.compiled import CompiledGenerator
+
+
+def working_size(height, width, max_side=1024, multiple=256):
+    """
+    Size an image is resized to before native-resolution inference: the
+    original aspect ratio, scaled down so the longer side fits max_side and
+    up so the shorter side is at least one multiple
+    """
+    scale = min(1.0, max_side / max(height, width))
+    scale = max(scale, multiple / min(height, width))
+    return max(multiple, round(height * scale)), max(multiple, round(width * scale))
+
+
+def bucket_shape(height, width, multiple=256):
+    """
+    Rounds a working size up to the padded shape the generator runs at
+    """
+    return (-(-height // multiple) * multiple, -(-width // multiple) * multiple)
+
+
+class BucketedGenerator:
+    """
+    Runs a fully convolutional generator near native resolution.
+
+    Inputs are reflect-padded up to the next multiple of multiple in each
+    dimension, so any image falls into one of a few shape buckets and each
+    bucket traces its CompiledGenerator once. multiple must be divisible by
+    the generator's total downsampling factor, 256 for the pix2pix U-Net.
+    Latency is recorded per bucket
+    """
+
+    def __init__(self, model, training=False, multiple=256, max_side=1024,
+                 jit_compile=None):
+        # a CompiledGenerator is unwrapped and recompiled per bucket, other
+        # callables such as a TFLiteModel are called at the bucket shape
+        self.keras_model = getattr(model, "model", None)
+        self.model = model
+        self.training = getattr(model, "training", training)
+        self.jit_compile = jit_compile
+        self.multiple = multiple
+        self.max_side = max_side
+
+        self.generators = {}
+        self.latencies = {}
+        self._lock = threading.Lock()
+
+    def working_size(self, height, width):
+        return working_size(height, width, self.max_side, self.multiple)
+
+    def _generator(self, bucket):
+        with self._lock:
+            if bucket not in self.generators:
+                if self.keras_model is not None:
+                    self.generators[bucket] = CompiledGenerator(
+                        self.keras_model, input_shape=(None,) + bucket + (3,),
+                        training=self.training, jit_compile=self.jit_compile)
+                else:
+                    self.generators[bucket] = self.model
+                self.latencies[bucket] = []
+            return self.generators[bucket]
+
+    def __call__(self, x):
+        """
+        Converts a (N, H, W, 3) float32 batch in [-1, 1], returning a batch
+        of the same size
+        """
+        x = tf.cast(x, tf.float32)
+        height, width = x.shape[1], x.shape[2]
+        bucket = bucket_shape(height, width, self.multiple)
+        padded = tf.pad(x, [[0, 0], [0, bucket[0] - height],
+                            [0, bucket[1] - width], [0, 0]], mode="REFLECT")
+
+        generator = self._generator(bucket)
+        start = time.perf_counter()
+        output = np.asarray(generator(padded))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[bucket].append(elapsed)
+        return output[:, :height, :width]
+
+    def warmup(self, height, width, batch_size=1):
+        size = self.working_size(height, width)
+        self(tf.zeros((batch_size,) + size + (3,)))
+
+    def report(self, skip_first=True):
+        """
+        Calls, p50 and p95 latency per bucket. The first call of a bucket
+        includes tracing and is left out by default
+        """
+        report = {}
+        with self._lock:
+            for bucket, times in self.latencies.items():
+                times = times[1:] if skip_first and len(times) > 1 else times
+                if not times:
+                    continue
+                key = f"{bucket[1]}x{bucket[0]}"
+                report[key] = {"calls": len(self.latencies[bucket]),
+                               "p50_ms": float(np.percentile(times, 50) * 1000),
+                               "p95_ms": float(np.percentile(times, 95) * 1000)}
+        return report
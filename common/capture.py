@@ -0,0 +1,134 @@
+import threading
+import time
+import cv2
+
+
+def parse_source(source):
+    """
+    Camera indices come in as strings from the command line
+    """
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+class LatestFrameCapture:
+    """
+    Reads frames on a background thread and keeps only the newest one, so
+    a slow consumer always gets the freshest frame instead of a backlog.
+    Video files are paced at their own frame rate by default to behave like
+    a camera
+    """
+
+    def __init__(self, source=0, paced=None):
+        self.source = parse_source(source)
+        self.cap = cv2.VideoCapture(self.source)
+        self.is_file = not isinstance(self.source, int)
+        self.paced = self.is_file if paced is None else paced
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_interval = 1 / fps if fps > 0 else 0
+
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self._frame = None
+        self._frame_id = 0
+        self._taken_id = 0
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        next_time = time.perf_counter()
+        while not self._stop.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            if self.paced and self.frame_interval:
+                next_time += self.frame_interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            with self._condition:
+                if self._frame_id > self._taken_id:
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._frame_id += 1
+                self.frames_read += 1
+                self._condition.notify_all()
+
+        with self._condition:
+            self._stop.set()
+            self._condition.notify_all()
+
+    def read(self, timeout=None):
+        """
+        Waits for a frame newer than the last one returned. Returns
+        (False, None) once the source is exhausted or stopped
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._frame_id > self._taken_id or self._stop.is_set(),
+                timeout)
+            if self._frame_id == self._taken_id:
+                return False, None
+            self._taken_id = self._frame_id
+            return True, self._frame
+
+    def release(self):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.cap.release()
+
+
+class HUD:
+    """
+    Smoothed fps and inference latency, drawn onto the output frame
+    """
+
+    def __init__(self, smoothing=0.9):
+        self.smoothing = smoothing
+        self.fps = 0.0
+        self.latency_ms = 0.0
+        self._last = None
+
+    def _smooth(self, old, new):
+        if old == 0.0:
+            return new
+        return self.smoothing * old + (1 - self.smoothing) * new
+
+    def update(self, latency=None):
+        """
+        Counts one displayed frame, with the inference latency when the
+        generator actually ran for it
+        """
+        now = time.perf_counter()
+        if self._last is not None:
+            self.fps = self._smooth(self.fps, 1 / max(now - self._last, 1e-6))
+        self._last = now
+        if latency is not None:
+            self.latency_ms = self._smooth(self.latency_ms, latency * 1000)
+
+    def draw(self, frame, dropped=0, skip_rate=None):
+        lines = [f"fps {self.fps:.1f}",
+                 f"inference {self.latency_ms:.1f} ms",
+                 f"dropped {dropped}"]
+        if skip_rate is not None:
+            lines.append(f"skipped {skip_rate:.0%}")
+        for i, line in enumerate(lines):
+            org = (8, 20 + i * 18)
+            cv2.putText(frame, line, org, cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                        (0, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(frame, line, org, cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                        (255, 255, 255), 1, cv2.LINE_AA)
+        return frame
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+
+class ChangeDetector:
+    """
+    Decides whether a frame differs enough from the last converted one to
+    be worth another generator pass.
+
+    Frames are shrunk to a small grayscale thumbnail and compared by mean
+    absolute difference, on the 0-255 scale, against the thumbnail of the
+    last frame that was reported as changed. Comparing against that frame
+    rather than the previous one keeps slow drift from going unnoticed
+    """
+
+    def __init__(self, threshold=2.0, size=(32, 32)):
+        self.threshold = threshold
+        self.size = size
+        self.frames = 0
+        self.skipped = 0
+        self._reference = None
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = small.mean(axis=2)
+        return small.astype(np.float32)
+
+    def changed(self, frame):
+        self.frames += 1
+        thumbnail = self._thumbnail(frame)
+        if (self._reference is not None
+                and np.abs(thumbnail - self._reference).mean() <= self.threshold):
+            self.skipped += 1
+            return False
+        self._reference = thumbnail
+        return True
+
+    def reset(self):
+        self._reference = None
+
+    @property
+    def skip_rate(self):
+        return self.skipped / self.frames if self.frames else 0.0
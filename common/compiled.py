@@ -0,0 +1,90 @@
+import argparse
+import os
+import time
+import numpy as np
+import tensorflow as tf
+
+# set GENERATOR_JIT_COMPILE=1 to compile the generators with XLA
+JIT_COMPILE = os.environ.get("GENERATOR_JIT_COMPILE", "0") == "1"
+
+
+class CompiledGenerator:
+    """
+    Wraps a Keras generator in a tf.function with a fixed input signature,
+    so every call reuses one traced graph instead of running the layers
+    eagerly one by one. The batch dimension is left open so batched callers
+    do not retrace
+    """
+
+    def __init__(self, model, input_shape=(None, 256, 256, 3), training=False,
+                 jit_compile=None):
+        self.model = model
+        self.training = training
+        self.input_shape = input_shape
+        self.jit_compile = JIT_COMPILE if jit_compile is None else jit_compile
+        self._fn = tf.function(self._call,
+                               input_signature=[tf.TensorSpec(input_shape,
+                                                              tf.float32)],
+                               jit_compile=self.jit_compile)
+
+    def _call(self, x):
+        return self.model(x, training=self.training)
+
+    def __call__(self, x):
+        return self._fn(tf.cast(x, tf.float32))
+
+
+def measure_latency(fn, x, runs=50, warmup=5):
+    for _ in range(warmup):
+        np.asarray(fn(x))
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        np.asarray(fn(x))
+        times.append((time.perf_counter() - start) * 1000)
+
+    return {"mean_ms": float(np.mean(times)),
+            "p50_ms": float(np.percentile(times, 50)),
+            "p95_ms": float(np.percentile(times, 95))}
+
+
+def compare_latency(model, training=False, batch_size=1, runs=50):
+    """
+    Per-frame latency of the eager call, predict, the tf.function wrapper and
+    the XLA compiled wrapper on the same random input
+    """
+    x = tf.random.uniform((batch_size, 256, 256, 3), -1, 1)
+    paths = {
+        "eager": lambda x: model(x, training=training),
+        "predict": lambda x: model.predict(x, verbose=0),
+        "tf.function": CompiledGenerator(model, training=training,
+                                         jit_compile=False),
+        "tf.function+xla": CompiledGenerator(model, training=training,
+                                             jit_compile=True),
+    }
+    return {name: measure_latency(fn, x, runs=runs)
+            for name, fn in paths.items()}
+
+
+if __name__ == "__main__":
+    from common.models import load_model
+
+    parser = argparse.ArgumentParser(
+        description="Compare eager and compiled generator latency")
+    parser.add_argument("model", choices=["facades", "vangogh"])
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--training", action="store_true",
+                        help="call the generator with training=True")
+    args = parser.parse_args()
+
+    results = compare_latency(load_model(args.model),
+                              training=args.training,
+                              batch_size=args.batch_size,
+                              runs=args.runs)
+    eager = results["eager"]["p50_ms"]
+    for name, stats in results.items():
+        print(f"{name:16s} p50 {stats['p50_ms']:8.2f} ms  "
+              f"p95 {stats['p95_ms']:8.2f} ms  "
+              f"speedup {eager / stats['p50_ms']:.2f}x")
@@ -0,0 +1,163 @@
+import glob
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+_model = None
+
+
+def list_images(input_dir):
+    return sorted(path for path in glob.glob(os.path.join(input_dir, "**", "*"),
+                                             recursive=True)
+                  if path.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def thread_budget(workers, cores=None):
+    """
+    TensorFlow threads per worker so that workers x threads never exceeds
+    the cores
+    """
+    cores = cores or os.cpu_count() or 1
+    return max(1, cores // max(1, workers))
+
+
+def _init_worker(name, model_path, training, threads):
+    """
+    Pins TensorFlow's thread pools before the first op runs, then loads the
+    model once per worker process
+    """
+    global _model
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except RuntimeError:
+        # already initialised when converting in the calling process
+        pass
+    from common.models import load_runtime_model
+    _model = load_runtime_model(name, path=model_path, training=training)
+
+
+def _convert_batch(job):
+    """
+    Converts one batch of files, returning (path, seconds, error) per file.
+    A file's time is its own decode and encode plus its share of the batch
+    inference
+    """
+    import tensorflow as tf
+    from common.decode import load_normalized
+
+    paths, input_dir, output_dir = job
+    results = []
+    inputs = []
+    decoded = []
+    for path in paths:
+        start = time.perf_counter()
+        try:
+            inputs.append(load_normalized(path, (256, 256)))
+            decoded.append((path, time.perf_counter() - start))
+        except Exception as e:
+            results.append((path, time.perf_counter() - start, str(e)))
+    if not inputs:
+        return results
+
+    start = time.perf_counter()
+    outputs = _model(tf.stack(inputs))
+    outputs = tf.cast(tf.clip_by_value(outputs * 127.5 + 127.5, 0, 255),
+                      tf.uint8).numpy()
+    share = (time.perf_counter() - start) / len(inputs)
+
+    for (path, decode_time), output in zip(decoded, outputs):
+        start = time.perf_counter()
+        error = None
+        try:
+            target = os.path.join(output_dir, os.path.relpath(path, input_dir))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if target.lower().endswith(".png"):
+                data = tf.io.encode_png(output)
+            else:
+                data = tf.io.encode_jpeg(output, quality=95)
+            tf.io.write_file(target, data)
+        except Exception as e:
+            error = str(e)
+        results.append((path, decode_time + share + time.perf_counter() - start,
+                        error))
+    return results
+
+
+def convert_dir(name, input_dir, output_dir, workers=None, batch_size=8,
+                training=False, model_path=None):
+    """
+    Converts every image under input_dir into the same relative path under
+    output_dir with worker processes, each running TensorFlow on its share
+    of the cores. workers=0 runs in this process on all cores. Returns a
+    summary dict
+    """
+    from common.models import BATCH_STATISTICS
+    if training and name in BATCH_STATISTICS and batch_size > 1:
+        # batch statistics would make each file depend on its batchmates
+        print(f"{name} runs with training=True, converting one image at a "
+              f"time instead of batches of {batch_size}", file=sys.stderr)
+        batch_size = 1
+    cores = os.cpu_count() or 1
+    if workers is None:
+        workers = max(1, cores // 4)
+    paths = list_images(input_dir)
+    jobs = [(paths[i:i + batch_size], input_dir, output_dir)
+            for i in range(0, len(paths), batch_size)]
+    threads = thread_budget(workers, cores)
+    init_args = (name, model_path, training, threads)
+
+    results = []
+    start = time.perf_counter()
+    if workers == 0:
+        _init_worker(*init_args)
+        for job in jobs:
+            results.extend(_convert_batch(job))
+    else:
+        # spawn, since forking a process with TensorFlow loaded is unsafe
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=init_args) as pool:
+            for batch in pool.imap_unordered(_convert_batch, jobs):
+                results.extend(batch)
+                print(f"\r{len(results)}/{len(paths)} files", end="",
+                      file=sys.stderr)
+        print(file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds for _, seconds, error in results if error is None]
+    failed = [(path, error) for path, _, error in results if error is not None]
+    for path, error in failed:
+        print(f"Failed {path}: {error}", file=sys.stderr)
+    return {"files": len(latencies),
+            "failed": len(failed),
+            "seconds": elapsed,
+            "files_per_second": len(latencies) / elapsed if elapsed else 0.0,
+            "workers": workers,
+            "threads_per_worker": threads,
+            "batch_size": batch_size,
+            "p50_ms": float(np.percentile(latencies, 50) * 1000) if latencies else 0.0,
+            "p95_ms": float(np.percentile(latencies, 95) * 1000) if latencies else 0.0}
+
+
+def print_summary(summary):
+    print(f"Converted {summary['files']} files ({summary['failed']} failed) in "
+          f"{summary['seconds']:.2f}s: {summary['files_per_second']:.2f} files/s "
+          f"with {summary['workers']} workers x "
+          f"{summary['threads_per_worker']} threads, "
+          f"batch size {summary['batch_size']}. Per file p50 "
+          f"{summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms")
+
+
+def add_arguments(parser):
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, 0 for none; by default one "
+                             "per 4 cores")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="images per generator call, always 1 for "
+                             "facades, whose BatchNorm uses batch statistics")
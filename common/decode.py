@@ -0,0 +1,57 @@
+import tensorflow as tf
+
+# libjpeg can scale by these factors while decoding, skipping most of the
+# inverse DCT work for large photos
+DCT_RATIOS = (8, 4, 2)
+
+# mean absolute difference, in the [-1, 1] model input range, allowed
+# between decode_resized and a full decode followed by a resize. The scaled
+# decode averages pixels where a bilinear resize of the full image samples
+# them, so textured photos differ slightly more than smooth ones
+MEAN_ABS_TOLERANCE = 0.04
+
+
+def dct_ratio(height, width, size):
+    """
+    Largest DCT scaling factor that still decodes to at least size (h, w)
+    """
+    for ratio in DCT_RATIOS:
+        if height // ratio >= size[0] and width // ratio >= size[1]:
+            return ratio
+    return 1
+
+
+def decode_resized(data, size=(256, 256)):
+    """
+    Decodes encoded image bytes straight to size as uint8-range float32.
+    JPEGs larger than size are decoded at a reduced DCT scale first, so a
+    20 MP photo is never decoded at full resolution
+    """
+    if tf.io.is_jpeg(data):
+        shape = tf.image.extract_jpeg_shape(data).numpy()
+        ratio = dct_ratio(shape[0], shape[1], size)
+        img = tf.io.decode_jpeg(data, 3, ratio=ratio)
+    else:
+        img = tf.io.decode_image(data, 3, expand_animations=False)
+    return tf.image.resize(img, size)
+
+
+def encoded_size(data):
+    """
+    (height, width) of encoded image bytes, read from the jpeg header
+    without decoding when possible
+    """
+    if tf.io.is_jpeg(data):
+        shape = tf.image.extract_jpeg_shape(data)
+    else:
+        shape = tf.shape(tf.io.decode_image(data, 3, expand_animations=False))
+    return int(shape[0]), int(shape[1])
+
+
+def load_normalized(path, size=(256, 256)):
+    """
+    The generators' [-1, 1] input for an image file, normalising only
+    after the resize
+    """
+    img = decode_resized(tf.io.read_file(path), size)
+    return (img - 127.5) / 127.5
@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+
+
+class Job:
+    """
+    One submitted call. submitted, started and finished are perf_counter
+    times, result or error is set once it ran
+    """
+
+    def __init__(self, fn, callback, key=None):
+        self.fn = fn
+        self.callback = callback
+        self.key = key
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.cancelled = False
+
+    @property
+    def latency(self):
+        """
+        Seconds from submit to finish, including the wait in the queue
+        """
+        if self.finished is None:
+            return None
+        return self.finished - self.submitted
+
+
+class InferenceExecutor:
+    """
+    Runs inference for a Tk app on one worker thread and hands results back
+    on the Tk thread.
+
+    submit(fn, callback, key) queues fn() and later calls callback(job) from
+    widget.after() polling. A submit whose key matches a queued or running
+    job returns that job instead of queueing a duplicate, so repeated clicks
+    on the same input are coalesced. By default a new key supersedes older
+    work: queued jobs are dropped and a running job's result is discarded,
+    since a single model cannot usefully run two requests at once
+    """
+
+    def __init__(self, widget, interval=30, window=50, name="inference"):
+        self.widget = widget
+        self.interval = interval
+
+        self.completed = 0
+        self.cancelled = 0
+        self.coalesced = 0
+        self.latencies = deque(maxlen=window)
+        self.waits = deque(maxlen=window)
+
+        self._pending = deque()
+        self._running = None
+        self._finished = deque()
+        self._polling = False
+        self._stop = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name,
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, callback, key=None, replace=True):
+        with self._cond:
+            if key is not None:
+                for job in [self._running, *self._pending]:
+                    if job is not None and job.key == key and not job.cancelled:
+                        self.coalesced += 1
+                        return job
+            if replace:
+                self._cancel_all()
+            job = Job(fn, callback, key)
+            self._pending.append(job)
+            self._cond.notify()
+        self._schedule_poll()
+        return job
+
+    def _cancel_all(self):
+        # called with self._cond held
+        for job in self._pending:
+            job.cancelled = True
+            self.cancelled += 1
+        self._pending.clear()
+        if self._running is not None and not self._running.cancelled:
+            self._running.cancelled = True
+            self.cancelled += 1
+
+    def cancel_all(self):
+        """
+        Drops queued jobs and discards the result of the running one
+        """
+        with self._cond:
+            self._cancel_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                job = self._pending.popleft()
+                self._running = job
+            job.started = time.perf_counter()
+            try:
+                job.result = job.fn()
+            except Exception as e:
+                job.error = e
+            job.finished = time.perf_counter()
+            with self._cond:
+                self._running = None
+                self._finished.append(job)
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.interval, self._poll)
+
+    def _poll(self):
+        with self._cond:
+            finished = list(self._finished)
+            self._finished.clear()
+            outstanding = bool(self._pending) or self._running is not None
+        for job in finished:
+            if job.cancelled:
+                continue
+            self.completed += 1
+            self.latencies.append(job.latency)
+            self.waits.append(job.started - job.submitted)
+            job.callback(job)
+        if outstanding:
+            self.widget.after(self.interval, self._poll)
+        else:
+            self._polling = False
+
+    @property
+    def queue_depth(self):
+        """
+        Jobs waiting plus the one running
+        """
+        with self._cond:
+            return len(self._pending) + (self._running is not None)
+
+    def stats(self):
+        latencies = list(self.latencies)
+        waits = list(self.waits)
+        stats = {"queue_depth": self.queue_depth,
+                 "completed": self.completed,
+                 "cancelled": self.cancelled,
+                 "coalesced": self.coalesced}
+        if latencies:
+            stats["latency_p50_ms"] = float(np.percentile(latencies, 50) * 1000)
+            stats["latency_p95_ms"] = float(np.percentile(latencies, 95) * 1000)
+            stats["wait_p50_ms"] = float(np.percentile(waits, 50) * 1000)
+        return stats
+
+    def summary(self):
+        """
+        One line of queue depth and job latency for a status label
+        """
+        stats = self.stats()
+        text = f"佇列 {stats['queue_depth']}"
+        if "latency_p50_ms" in stats:
+            text += (f", 延遲 p50 {stats['latency_p50_ms']:.0f} ms"
+                     f" / p95 {stats['latency_p95_ms']:.0f} ms")
+        return text
+
+    def shutdown(self):
+        with self._cond:
+            self._cancel_all()
+            self._stop = True
+            self._cond.notify()
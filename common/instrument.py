@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# TIMING_LOG appends every stage timing as a json line, PROFILE_DIR is where
+# tf.profiler traces go
+TIMING_LOG = os.environ.get("TIMING_LOG") or None
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profile_logs")
+
+STAGES = ("decode", "preprocess", "inference", "postprocess", "display",
+          "total")
+
+
+class Instrument:
+    """
+    Stage timers shared by an app. Each stage keeps a rolling window of its
+    latest timings for the on-screen readout, and every timing can also be
+    appended to a json-lines log. profile(n) captures a tf.profiler trace of
+    the next n inference stages.
+
+    Stages can be timed from several threads. On a GPU, work queued by one
+    stage is only waited for by the first stage that reads a result back,
+    so time inference up to a .numpy() or np.asarray call
+    """
+
+    def __init__(self, app, window=50, log_path=None, profile_dir=None):
+        self.app = app
+        self.window = window
+        self.log_path = TIMING_LOG if log_path is None else log_path
+        self.profile_dir = profile_dir or PROFILE_DIR
+
+        self.timings = {}
+        self.profiling_left = 0
+        self._lock = threading.Lock()
+        self._log = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            if name not in self.timings:
+                self.timings[name] = deque(maxlen=self.window)
+            self.timings[name].append(seconds)
+            if self.log_path:
+                if self._log is None:
+                    self._log = open(self.log_path, "a")
+                self._log.write(json.dumps({"time": time.time(), "app": self.app,
+                                            "stage": name,
+                                            "ms": seconds * 1000}) + "\n")
+                self._log.flush()
+            if name == "inference" and self.profiling_left > 0:
+                self.profiling_left -= 1
+                if self.profiling_left == 0:
+                    self._stop_profiler()
+
+    def profile(self, inferences=10):
+        """
+        Starts a tf.profiler trace that stops by itself after the given
+        number of inference stages. Returns False if one is already running
+        """
+        import tensorflow as tf
+
+        with self._lock:
+            if self.profiling_left > 0:
+                return False
+            tf.profiler.experimental.start(self.profile_dir)
+            self.profiling_left = inferences
+            return True
+
+    def _stop_profiler(self):
+        import tensorflow as tf
+        tf.profiler.experimental.stop()
+
+    def stats(self):
+        """
+        count, mean, p50 and p95 in milliseconds per stage over the window
+        """
+        with self._lock:
+            timings = {name: list(times) for name, times in self.timings.items()}
+        return {name: {"count": len(times),
+                       "mean_ms": float(np.mean(times) * 1000),
+                       "p50_ms": float(np.percentile(times, 50) * 1000),
+                       "p95_ms": float(np.percentile(times, 95) * 1000)}
+                for name, times in timings.items() if times}
+
+    def summary(self):
+        """
+        One line of p50 stage latencies for a status label
+        """
+        stats = self.stats()
+        ordered = [name for name in STAGES if name in stats]
+        ordered += [name for name in stats if name not in STAGES]
+        parts = [f"{name} {stats[name]['p50_ms']:.1f}" for name in ordered]
+        text = " | ".join(parts) + " ms (p50)" if parts else ""
+        if self.profiling_left > 0:
+            text += f" [profiling, {self.profiling_left} left]"
+        return text
+
+    def close(self):
+        with self._lock:
+            if self.profiling_left > 0:
+                self.profiling_left = 0
+                self._stop_profiler()
+            if self._log is not None:
+                self._log.close()
+                self._log = None
@@ -0,0 +1,145 @@
+import os
+import sys
+import numpy as np
+
+# keras, tflite-fp16 or tflite-int8, see common/tflite_export.py
+BACKEND = os.environ.get("MODEL_BACKEND", "keras")
+BACKENDS = ("keras", "tflite-fp16", "tflite-int8")
+
+# set MODEL_PRECOMPILED=0 to ignore the SavedModels from common/precompile.py
+PREFER_PRECOMPILED = os.environ.get("MODEL_PRECOMPILED", "1") == "1"
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODEL_PATHS = {
+    "facades": os.path.join(ROOT, "GAN", "facades", "p2p_gen_facades.keras"),
+    "vangogh": os.path.join(ROOT, "GAN", "photo_vangogh", "gen_f.h5"),
+    "esrgan": os.path.join(ROOT, "GAN", "photo_enhance", "esrgan-tf2"),
+    "brain_tumor": os.path.join(ROOT, "CNN", "brain_tumor",
+                                "brain_tumor_detector.h5"),
+}
+
+GENERATORS = ("facades", "vangogh")
+PRECOMPILABLE = ("vangogh", "facades", "brain_tumor")
+
+# training flag baked into exported artifacts, matching the GUI apps
+EXPORT_TRAINING = {"facades": True, "vangogh": False, "brain_tumor": False}
+
+# models with BatchNorm, whose outputs at training=True depend on the rest
+# of the batch; vangogh's InstanceNorm normalises each image on its own
+BATCH_STATISTICS = ("facades",)
+
+
+def tflite_path(name, quantization):
+    return f"{os.path.splitext(MODEL_PATHS[name])[0]}_{quantization}.tflite"
+
+
+def precompiled_path(path):
+    return f"{os.path.splitext(path)[0]}_precompiled"
+
+
+def find_precompiled(path):
+    """
+    The precompiled SavedModel for a model file, if one exists and is not
+    older than the file
+    """
+    precompiled = precompiled_path(path)
+    marker = os.path.join(precompiled, "saved_model.pb")
+    if not os.path.exists(marker):
+        return None
+    if os.path.exists(path) and os.path.getmtime(marker) < os.path.getmtime(path):
+        return None
+    return precompiled
+
+
+def get_custom_objects(name):
+    if name == "vangogh":
+        vangogh_dir = os.path.join(ROOT, "GAN", "photo_vangogh")
+        if vangogh_dir not in sys.path:
+            sys.path.append(vangogh_dir)
+        from instance_norm import InstanceNormalization
+        return {"CycleGAN>InstanceNormalization": InstanceNormalization}
+    return None
+
+
+def load_model(name, path=None):
+    """
+    Loads one of the shipped models by name from anywhere in the repo
+    """
+    import tensorflow as tf
+
+    path = path or MODEL_PATHS[name]
+    if name == "esrgan":
+        return tf.keras.models.load_model(path)
+    return tf.keras.models.load_model(path,
+                                      custom_objects=get_custom_objects(name),
+                                      compile=False)
+
+
+def load_runtime_model(name, path=None, training=False, backend=None,
+                       precompiled=None):
+    """
+    Loads a model for inference on the selected backend. Generators come
+    back as a CompiledGenerator, the classifier as a Keras model, and both as
+    a TFLiteModel on the tflite backends, where the training flag baked in at
+    export time applies. On the keras backend a PrecompiledModel is
+    preferred when common/precompile.py has written one for the file, unless
+    precompiled is False
+    """
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend {backend}, expected one of "
+                         f"{', '.join(BACKENDS)}")
+
+    if backend != "keras":
+        from common.tflite_runtime import TFLiteModel
+        return TFLiteModel(tflite_path(name, backend.split("-", 1)[1]))
+
+    if precompiled is None:
+        precompiled = PREFER_PRECOMPILED
+    if precompiled and name in PRECOMPILABLE:
+        precompiled = find_precompiled(path or MODEL_PATHS[name])
+        if precompiled is not None:
+            from common.precompile import PrecompiledModel
+            return PrecompiledModel(precompiled, training=training)
+
+    model = load_model(name, path)
+    if name in GENERATORS:
+        from common.compiled import CompiledGenerator
+        return CompiledGenerator(model, training=training)
+    return model
+
+
+def load_input(name, path, image_size=(256, 256)):
+    """
+    Decodes an image file into the unbatched float32 input the named model
+    was trained on
+    """
+    import tensorflow as tf
+
+    if name != "brain_tumor":
+        from common.decode import load_normalized
+        return load_normalized(path, image_size)
+
+    img = tf.io.decode_jpeg(tf.io.read_file(path), 3)
+    return prepare_input(name, img, image_size)
+
+
+def prepare_input(name, img, image_size=(256, 256)):
+    """
+    Turns a decoded (H, W, 3) uint8 image into the unbatched float32 input
+    the named model was trained on
+    """
+    import tensorflow as tf
+
+    if name == "brain_tumor":
+        tumor_dir = os.path.join(ROOT, "CNN", "brain_tumor")
+        if tumor_dir not in sys.path:
+            sys.path.append(tumor_dir)
+        from preprocess import crop_img
+        return tf.cast(crop_img(np.asarray(img), image_size=image_size),
+                       tf.float32)
+
+    img = tf.cast(img, tf.float32)
+    img = (img - 127.5) / 127.5
+    return tf.image.resize(img, image_size)
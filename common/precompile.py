@@ -0,0 +1,84 @@
+import argparse
+import sys
+import time
+import tensorflow as tf
+from common.models import (GENERATORS, MODEL_PATHS, PRECOMPILABLE, load_model,
+                           precompiled_path)
+
+
+def input_signature(name):
+    # the generators are fully convolutional, so any spatial size is allowed
+    # for native-resolution callers; the classifier needs 256x256
+    if name in GENERATORS:
+        return [tf.TensorSpec((None, None, None, 3), tf.float32)]
+    return [tf.TensorSpec((None, 256, 256, 3), tf.float32)]
+
+
+def export(name, path=None):
+    """
+    Saves the model's forward pass as a SavedModel of traced concrete
+    functions next to the source file, one per training flag for the
+    generators, so loading skips HDF5 parsing, Keras deserialisation and
+    tracing
+    """
+    path = path or MODEL_PATHS[name]
+    model = load_model(name, path)
+
+    module = tf.Module()
+    module.model = model
+    signature = input_signature(name)
+    module.inference = tf.function(lambda x: model(x, training=False),
+                                   input_signature=signature)
+    if name in GENERATORS:
+        module.training = tf.function(lambda x: model(x, training=True),
+                                      input_signature=signature)
+
+    output = precompiled_path(path)
+    tf.saved_model.save(module, output,
+                        signatures={"serving_default": module.inference})
+    return output
+
+
+class PrecompiledModel:
+    """
+    Calls a SavedModel written by export() with the calling conventions the
+    apps use for the Keras models and CompiledGenerator
+    """
+
+    def __init__(self, path, training=False):
+        self.path = path
+        self.training = training
+        self.loaded = tf.saved_model.load(path)
+        self._fn = self.loaded.training if training else self.loaded.inference
+
+    def __call__(self, x, training=None):
+        return self._fn(tf.cast(x, tf.float32))
+
+    def predict(self, x, verbose=0):
+        return self(x).numpy()
+
+    def predict_on_batch(self, x):
+        return self(x).numpy()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Precompile the shipped Keras models to SavedModels the "
+                    "apps load instead")
+    parser.add_argument("models", nargs="*",
+                        help=f"any of {', '.join(PRECOMPILABLE)}, all by default")
+    args = parser.parse_args(argv)
+    for name in args.models:
+        if name not in PRECOMPILABLE:
+            parser.error(f"cannot precompile {name}")
+
+    for name in args.models or PRECOMPILABLE:
+        start = time.perf_counter()
+        output = export(name)
+        print(f"Precompiled {name} to {output} in "
+              f"{time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
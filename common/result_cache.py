@@ -0,0 +1,132 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from common.models import BACKEND, MODEL_PATHS, tflite_path
+
+# RESULT_CACHE_MB bounds the in-memory cache, RESULT_CACHE_DIR also keeps
+# results on disk across runs
+CACHE_MB = float(os.environ.get("RESULT_CACHE_MB", "256"))
+CACHE_DIR = os.environ.get("RESULT_CACHE_DIR") or None
+
+
+def model_identity(name, *params, backend=None):
+    """
+    Identifies the exact model behind a result: its name, the backend, the
+    size and modification time of the model file, and any extra parameters
+    that change the output
+    """
+    backend = backend or BACKEND
+    path = MODEL_PATHS[name]
+    if backend != "keras":
+        path = tflite_path(name, backend.split("-", 1)[1])
+    elif os.path.isdir(path):
+        path = os.path.join(path, "saved_model.pb")
+    try:
+        stat = os.stat(path)
+        version = f"{stat.st_size}-{stat.st_mtime_ns}"
+    except OSError:
+        version = "missing"
+    return "|".join([name, backend, version] + [str(p) for p in params])
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache of numpy results keyed by input file content and model
+    identity, bounded by max_bytes in memory. With cache_dir, results are
+    also written as .npy files and found again after a restart
+    """
+
+    def __init__(self, model_id, max_bytes=None, cache_dir=None):
+        self.model_id = model_id
+        self.max_bytes = int(CACHE_MB * 2**20) if max_bytes is None else max_bytes
+        self.cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, path):
+        digest = hashlib.sha1(self.model_id.encode("utf-8"))
+        digest.update(file_digest(path).encode("ascii"))
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+    def _remember(self, key, value):
+        if value.nbytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key).nbytes
+        self._entries[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.cache_dir:
+            try:
+                value = np.load(self._disk_path(key))
+            except (OSError, ValueError):
+                value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value)
+            return value
+
+    def put(self, key, value):
+        value = np.asarray(value)
+        with self._lock:
+            self._remember(key, value)
+        if self.cache_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, value)
+            os.replace(tmp, path)
+
+    def get_or_compute(self, path, compute):
+        """
+        Returns (result, hit), running compute() only on a miss
+        """
+        key = self.key(path)
+        value = self.get(key)
+        if value is not None:
+            return value, True
+        value = compute()
+        self.put(key, value)
+        return np.asarray(value), False
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self._entries), "bytes": self.nbytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,94 @@
+import threading
+import time
+
+# apps import this module before tkinter and tensorflow, so the timeline
+# starts before the heavy imports
+_process_start = time.perf_counter()
+
+
+class StartupTimeline:
+    def __init__(self, start=None):
+        self.start = _process_start if start is None else start
+        self.marks = {}
+        self.intervals = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        """
+        Records the first occurrence of name as seconds since start
+        """
+        with self._lock:
+            if name in self.marks:
+                return self.marks[name]
+            elapsed = time.perf_counter() - self.start
+            self.marks[name] = elapsed
+        print(f"[startup] {name}: {elapsed:.3f}s")
+        return elapsed
+
+    def interval(self, name, seconds):
+        """
+        Records the first occurrence of name as a duration of its own rather
+        than a point since start, for steps such as the first inference that
+        begin on a click and would otherwise include the user's idle time
+        """
+        with self._lock:
+            if name in self.intervals:
+                return self.intervals[name]
+            self.intervals[name] = seconds
+        print(f"[startup] {name}: {seconds:.3f}s after its click")
+        return seconds
+
+
+timeline = StartupTimeline()
+
+
+class BackgroundModel:
+    """
+    Loads a model on a worker thread and runs an optional warm-up pass on it,
+    so the window can open while tensorflow deserialises and traces the model
+    """
+
+    def __init__(self, loader, warmup=None):
+        self.model = None
+        self.error = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._load,
+                                        args=(loader, warmup),
+                                        daemon=True)
+        self._thread.start()
+
+    def _load(self, loader, warmup):
+        try:
+            model = loader()
+            timeline.mark("load")
+            if warmup is not None:
+                warmup(model)
+                timeline.mark("warmup")
+            self.model = model
+            # the app can serve its first request from here on
+            timeline.mark("ready")
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def ready(self):
+        return self.done() and self.error is None
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.ready
+
+    def when_done(self, widget, callback, interval=100):
+        """
+        Polls from the Tk event loop and calls callback(self) on the Tk
+        thread once loading finished, successfully or not
+        """
+        if self.done():
+            callback(self)
+        else:
+            widget.after(interval, self.when_done, widget, callback, interval)
@@ -0,0 +1,179 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import numpy as np
+import tensorflow as tf
+from common.compiled import measure_latency
+from common.models import (EXPORT_TRAINING, ROOT, MODEL_PATHS, load_input,
+                           load_model, tflite_path)
+from common.tflite_runtime import TFLiteModel
+
+EXPORTABLE = ("vangogh", "facades", "brain_tumor")
+QUANTIZATIONS = ("fp16", "int8")
+
+
+def calibration_inputs(name, calibration_dir=None, samples=100):
+    """
+    Yields batched float32 model inputs from a directory of jpegs, or random
+    inputs in the model's value range when no directory is given
+    """
+    paths = []
+    if calibration_dir:
+        paths = sorted(glob.glob(os.path.join(calibration_dir, "**", "*.jp*g"),
+                                 recursive=True))[:samples]
+    if paths:
+        for path in paths:
+            try:
+                yield tf.expand_dims(load_input(name, path), axis=0)
+            except Exception as e:
+                print(f"Skipping {path}: {e}", file=sys.stderr)
+        return
+
+    print(f"No calibration images for {name}, using random inputs",
+          file=sys.stderr)
+    low, high = (0, 255) if name == "brain_tumor" else (-1, 1)
+    for _ in range(min(samples, 16)):
+        yield tf.random.uniform((1, 256, 256, 3), low, high)
+
+
+def convert(name, model, quantization, calibration_dir=None):
+    training = EXPORT_TRAINING[name]
+    fn = tf.function(lambda x: model(x, training=training),
+                     input_signature=[tf.TensorSpec((None, 256, 256, 3),
+                                                    tf.float32)])
+    converter = tf.lite.TFLiteConverter.from_concrete_functions(
+        [fn.get_concrete_function()], model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == "fp16":
+        converter.target_spec.supported_types = [tf.float16]
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS,
+                                               tf.lite.OpsSet.SELECT_TF_OPS]
+    else:
+        def representative_dataset():
+            for x in calibration_inputs(name, calibration_dir):
+                yield [x]
+
+        # full-integer: weights and activations in int8, with only the
+        # float input and output quantized at the edges so the apps can
+        # call it without changes. No float or TF kernel fallback, so an
+        # op that cannot be quantized fails the export
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    try:
+        flatbuffer = converter.convert()
+    except Exception as e:
+        raise RuntimeError(f"{name} cannot be exported as {quantization}: "
+                           f"{e}") from e
+    if quantization == "int8":
+        remaining = float_tensors(flatbuffer)
+        if remaining:
+            raise RuntimeError(f"{name} int8 export left float tensors "
+                               f"inside the graph: {', '.join(remaining)}")
+
+    path = tflite_path(name, quantization)
+    with open(path, "wb") as f:
+        f.write(flatbuffer)
+    return path
+
+
+def float_tensors(flatbuffer):
+    """
+    Names of float tensors other than the model's inputs and outputs, which
+    a full-integer model quantizes and dequantizes right at the edges
+    """
+    interpreter = tf.lite.Interpreter(model_content=flatbuffer)
+    edges = {d["index"] for d in interpreter.get_input_details()}
+    edges |= {d["index"] for d in interpreter.get_output_details()}
+    return [d["name"] for d in interpreter.get_tensor_details()
+            if d["dtype"] in (np.float32, np.float16)
+            and d["index"] not in edges]
+
+
+def file_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, f))
+                   for root, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path)
+
+
+def compare(name, model, paths, calibration_dir=None, runs=30):
+    """
+    Latency, size and output drift of each exported file against the
+    original Keras model
+    """
+    training = EXPORT_TRAINING[name]
+    inputs = list(calibration_inputs(name, calibration_dir, samples=20))
+    reference = [model(x, training=training).numpy() for x in inputs]
+
+    report = {"keras": {
+        "size_mb": file_size(MODEL_PATHS[name]) / 2**20,
+        **measure_latency(lambda x: model(x, training=training), inputs[0],
+                          runs=runs)}}
+
+    for quantization, path in paths.items():
+        tflite = TFLiteModel(path)
+        outputs = [tflite(x) for x in inputs]
+        diffs = np.concatenate([np.abs(o - r).ravel()
+                                for o, r in zip(outputs, reference)])
+        entry = {"size_mb": file_size(path) / 2**20,
+                 **measure_latency(tflite, inputs[0], runs=runs),
+                 "mean_abs_diff": float(diffs.mean()),
+                 "max_abs_diff": float(diffs.max())}
+        if name == "brain_tumor":
+            agree = [o.argmax() == r.argmax() for o, r in zip(outputs, reference)]
+            entry["top1_agreement"] = float(np.mean(agree))
+        report[quantization] = entry
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export the shipped models to float16 and int8 TFLite")
+    parser.add_argument("models", nargs="*",
+                        help=f"any of {', '.join(EXPORTABLE)}, all by default")
+    parser.add_argument("--quantization", nargs="+", choices=QUANTIZATIONS,
+                        default=list(QUANTIZATIONS))
+    parser.add_argument("--calibration-dir", default=None,
+                        help="jpegs used to calibrate int8 activations and "
+                             "to measure output drift")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--report", default=os.path.join(ROOT,
+                                                         "tflite_report.json"))
+    args = parser.parse_args(argv)
+    for name in args.models:
+        if name not in EXPORTABLE:
+            parser.error(f"cannot export {name}")
+
+    reports = {}
+    for name in args.models or EXPORTABLE:
+        model = load_model(name)
+        paths = {}
+        for quantization in args.quantization:
+            paths[quantization] = convert(name, model, quantization,
+                                          args.calibration_dir)
+            print(f"Exported {paths[quantization]}")
+
+        reports[name] = compare(name, model, paths, args.calibration_dir,
+                                runs=args.runs)
+        for variant, stats in reports[name].items():
+            drift = ""
+            if "mean_abs_diff" in stats:
+                drift = (f"  drift mean {stats['mean_abs_diff']:.4f} "
+                         f"max {stats['max_abs_diff']:.4f}")
+            print(f"{name:12s} {variant:6s} {stats['size_mb']:8.2f} MB  "
+                  f"p50 {stats['p50_ms']:8.2f} ms{drift}")
+
+    with open(args.report, "w") as f:
+        json.dump(reports, f, indent=2)
+    print(f"Report written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import threading
+import numpy as np
+import tensorflow as tf
+
+
+class TFLiteModel:
+    """
+    Runs a .tflite model behind the calling conventions the apps use for
+    Keras models: model(x), model.predict(x) and model.predict_on_batch(x)
+    """
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.interpreter = tf.lite.Interpreter(model_path=path,
+                                               num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._lock = threading.Lock()
+        self._refresh_details()
+
+    def _refresh_details(self):
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+
+    def __call__(self, x, training=None):
+        x = np.asarray(x, np.float32)
+        with self._lock:
+            if tuple(x.shape) != tuple(self._input["shape"]):
+                self.interpreter.resize_tensor_input(self._input["index"],
+                                                     x.shape)
+                self.interpreter.allocate_tensors()
+                self._refresh_details()
+            self.interpreter.set_tensor(self._input["index"], x)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output["index"]).copy()
+
+    def predict(self, x, verbose=0):
+        return self(x)
+
+    def predict_on_batch(self, x):
+        return self(x)
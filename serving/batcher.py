@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+
+class DynamicBatcher:
+    """
+    Merges concurrent single-item requests into batches for one model.
+
+    A worker thread takes the first pending item and keeps collecting items
+    of the same shape until max_batch_size is reached or max_wait_ms has
+    passed since that first item, then runs predict_fn once on the stacked
+    batch and hands each caller its row. Items of a different shape wait
+    for the next batch
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=5,
+                 name="batcher"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._deferred = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name,
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, x):
+        """
+        Queues one unbatched input and returns a Future for its output
+        """
+        if self._stop.is_set():
+            raise RuntimeError(f"{self.name} is stopped")
+        future = Future()
+        self._queue.put((np.asarray(x), future))
+        return future
+
+    def __call__(self, x):
+        return self.submit(x).result()
+
+    def predict_many(self, xs):
+        """
+        Submits every row of xs separately so they can share batches with
+        other callers, and stacks the results
+        """
+        futures = [self.submit(x) for x in xs]
+        return np.stack([f.result() for f in futures])
+
+    def _next_item(self, timeout=None):
+        if self._deferred:
+            return self._deferred.pop(0)
+        return self._queue.get(timeout=timeout)
+
+    def _collect(self):
+        first = None
+        while first is None and not self._stop.is_set():
+            try:
+                first = self._next_item(timeout=0.1)
+            except queue.Empty:
+                pass
+        if first is None:
+            return []
+
+        batch = [first]
+        shape = first[0].shape
+        skipped = []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if self._deferred:
+                    item = self._deferred.pop(0)
+                elif remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0].shape == shape:
+                batch.append(item)
+            else:
+                skipped.append(item)
+        self._deferred = skipped + self._deferred
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            batch = [(x, f) for x, f in batch
+                     if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            futures = [f for _, f in batch]
+            inputs = np.stack([x for x, _ in batch])
+            try:
+                outputs = np.asarray(self.predict_fn(inputs))
+            except Exception as e:
+                for f in futures:
+                    f.set_exception(e)
+                continue
+
+            with self._lock:
+                self.batches += 1
+                self.items += len(futures)
+            for f, output in zip(futures, outputs):
+                f.set_result(output)
+
+    def stats(self):
+        with self._lock:
+            return {"batches": self.batches, "items": self.items,
+                    "mean_batch_size": self.items / self.batches
+                    if self.batches else 0.0,
+                    "queued": self._queue.qsize() + len(self._deferred)}
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        for x, f in self._deferred:
+            f.cancel()
+        while True:
+            try:
+                _, f = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            f.cancel()
@@ -0,0 +1,209 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# total resident memory the loaded models may be charged, 0 for no limit
+MEMORY_BUDGET_MB = int(os.environ.get("MODEL_MEMORY_MB", "2048"))
+
+
+def resident_bytes():
+    """
+    Resident set size of this process, or None where it cannot be read
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def weight_bytes(model):
+    """
+    Bytes held by a model's variables, 0 for models without any. Wrappers
+    such as CompiledGenerator and PrecompiledModel are looked through
+    """
+    for attr in ("model", "loaded"):
+        while hasattr(model, attr) and not hasattr(model, "weights"):
+            model = getattr(model, attr)
+    variables = getattr(model, "weights", None) or getattr(model, "variables", None)
+    return sum(int(v.shape.num_elements() or 0) * v.dtype.size
+               for v in variables or ())
+
+
+class _Entry:
+    def __init__(self, name):
+        self.name = name
+        self.service = None
+        self.users = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.resident_bytes = 0
+        self.weight_bytes = 0
+        self.last_used = None
+        self.load_lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Loads models on first use and keeps them under a memory budget.
+
+    factory(name) builds a service with warmup() and stop() methods. Each
+    load is charged the growth in process RSS across loading and warming
+    up, or the model's weight bytes when RSS is unavailable or did not
+    grow. When the loaded models' charges exceed budget_mb the least
+    recently used models that are not serving a request are stopped and
+    dropped. TensorFlow's allocator keeps freed memory for reuse, so RSS
+    does not shrink on eviction, but the next load reuses that memory
+    """
+
+    def __init__(self, factory, names, budget_mb=None):
+        self.factory = factory
+        self.names = tuple(names)
+        self.budget = (MEMORY_BUDGET_MB if budget_mb is None else budget_mb) * 2**20
+
+        self._entries = {name: _Entry(name) for name in self.names}
+        # loaded entries, least recently used first
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        # loads run one at a time so each RSS delta belongs to one model
+        self._load_lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    @contextmanager
+    def use(self, name):
+        """
+        Yields the loaded service for name, loading it first if needed. The
+        model cannot be evicted while in use
+        """
+        entry = self._entries[name]
+        with entry.load_lock:
+            with self._lock:
+                loaded = entry.service is not None
+                if loaded:
+                    self._touch(entry)
+            if not loaded:
+                self._load(entry)
+        try:
+            yield entry.service
+        finally:
+            with self._lock:
+                entry.users -= 1
+                evicted = self._evict()
+            self._stop(evicted)
+
+    def _touch(self, entry):
+        # called with self._lock held
+        entry.users += 1
+        entry.last_used = time.time()
+        self._loaded[entry.name] = entry
+        self._loaded.move_to_end(entry.name)
+
+    def _load(self, entry):
+        # make room up front when an earlier load told us the size
+        with self._lock:
+            evicted = self._evict(incoming=entry.resident_bytes)
+        self._stop(evicted)
+
+        with self._load_lock:
+            rss_before = resident_bytes()
+            start = time.perf_counter()
+            service = self.factory(entry.name)
+            loaded = time.perf_counter()
+            service.warmup()
+            warm = time.perf_counter()
+            rss_after = resident_bytes()
+
+        with self._lock:
+            entry.service = service
+            entry.loads += 1
+            entry.load_seconds = loaded - start
+            entry.warmup_seconds = warm - loaded
+            entry.weight_bytes = weight_bytes(getattr(service, "model", None))
+            grown = (rss_after - rss_before
+                     if rss_before is not None and rss_after is not None else 0)
+            entry.resident_bytes = max(grown, entry.weight_bytes)
+            self._touch(entry)
+            evicted = self._evict()
+        self._stop(evicted)
+
+    def _evict(self, incoming=0):
+        # called with self._lock held. Returns the dropped services for the
+        # caller to stop once the lock is released, since stopping waits
+        # for an in-flight batch and would block every other model
+        evicted = []
+        if not self.budget:
+            return evicted
+        for name in list(self._loaded):
+            if self.charged() + incoming <= self.budget:
+                break
+            entry = self._loaded[name]
+            if entry.users > 0:
+                continue
+            del self._loaded[name]
+            evicted.append(entry.service)
+            entry.service = None
+            entry.evictions += 1
+        return evicted
+
+    @staticmethod
+    def _stop(services):
+        for service in services:
+            service.stop()
+        if services:
+            services.clear()
+            gc.collect()
+
+    def charged(self):
+        return sum(entry.resident_bytes for entry in self._loaded.values())
+
+    def preload(self, names=None):
+        for name in names or self.names:
+            with self.use(name):
+                pass
+
+    def stats(self):
+        """
+        Per-model load state, memory and latency, plus the totals
+        """
+        with self._lock:
+            models = {}
+            for name, entry in self._entries.items():
+                stats = {"loaded": entry.service is not None,
+                         "in_use": entry.users,
+                         "loads": entry.loads,
+                         "evictions": entry.evictions,
+                         "load_s": entry.load_seconds,
+                         "warmup_s": entry.warmup_seconds,
+                         "resident_mb": entry.resident_bytes / 2**20,
+                         "weights_mb": entry.weight_bytes / 2**20,
+                         "last_used": entry.last_used}
+                if entry.service is not None:
+                    stats["batching"] = entry.service.batcher.stats()
+                models[name] = stats
+            rss = resident_bytes()
+            return {"models": models,
+                    "loaded": list(self._loaded),
+                    "charged_mb": self.charged() / 2**20,
+                    "budget_mb": self.budget / 2**20,
+                    "process_rss_mb": rss / 2**20 if rss is not None else None}
+
+    def stop(self):
+        with self._lock:
+            services = []
+            for entry in self._loaded.values():
+                services.append(entry.service)
+                entry.service = None
+            self._loaded.clear()
+        self._stop(services)
@@ -0,0 +1,237 @@
+import argparse
+import base64
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import tensorflow as tf
+from common.models import (EXPORT_TRAINING, ROOT, load_model,
+                           load_runtime_model, prepare_input)
+from serving.batcher import DynamicBatcher
+from serving.registry import MEMORY_BUDGET_MB, ModelRegistry
+
+MODELS = ("facades", "vangogh", "esrgan", "brain_tumor")
+
+
+def decode_image(data):
+    img = tf.io.decode_image(data, channels=3, expand_animations=False)
+    return img.numpy()
+
+
+def encode_png(img):
+    return tf.io.encode_png(img).numpy()
+
+
+def load_id_to_class(path=os.path.join(ROOT, "CNN", "brain_tumor",
+                                       "id_to_class.txt")):
+    id_to_cls = {}
+    with open(path, "r") as f:
+        for line in f.readlines():
+            target, classname = line.replace("\n", "").split("\t")
+            id_to_cls[int(target)] = classname
+    return id_to_cls
+
+
+class ModelService:
+    """
+    One hosted model: decodes a request image, sends the model input through
+    the model's DynamicBatcher and turns the output into a response
+    """
+
+    def __init__(self, name, max_batch_size=8, max_wait_ms=5, tile_size=256):
+        if EXPORT_TRAINING.get(name):
+            # BatchNorm in training mode normalises with batch statistics,
+            # so batching would make each output depend on other requests
+            max_batch_size = 1
+        self.name = name
+        self.tile_size = tile_size
+        self.max_batch_size = max_batch_size
+        self.model = None
+
+        if name == "esrgan":
+            model = load_model("esrgan")
+            predict_fn = lambda x: model(x).numpy()
+        elif name == "brain_tumor":
+            model = load_runtime_model("brain_tumor")
+            predict_fn = model.predict_on_batch
+            self.id_to_class = load_id_to_class()
+        else:
+            model = load_runtime_model(name, training=EXPORT_TRAINING[name])
+            predict_fn = lambda x: np.asarray(model(x))
+        self.model = model
+        self.batcher = DynamicBatcher(predict_fn, max_batch_size=max_batch_size,
+                                      max_wait_ms=max_wait_ms, name=name)
+
+    def warmup(self):
+        self.infer(np.zeros((256, 256, 3), np.uint8))
+
+    def infer(self, img):
+        """
+        Runs one decoded (H, W, 3) uint8 image. Returns a uint8 image for the
+        generators and ESRGAN, a dict for the classifier
+        """
+        if self.name == "esrgan":
+            from tiling import enhance_tiled
+            return enhance_tiled(self.batcher.predict_many, img,
+                                 tile_size=self.tile_size,
+                                 batch_size=self.max_batch_size)
+
+        output = self.batcher(prepare_input(self.name, img))
+        if self.name == "brain_tumor":
+            label = int(output.argmax())
+            return {"label": label,
+                    "class": self.id_to_class.get(label, str(label)),
+                    "probability": float(output[label]),
+                    "probabilities": [float(p) for p in output]}
+
+        return np.clip(np.rint(output * 127.5 + 127.5), 0, 255).astype(np.uint8)
+
+    def stop(self):
+        self.batcher.stop()
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health
+    GET  /v1/models                   load state, resident memory, load
+                                      latency and batching stats per model
+    POST /v1/models/<name>            raw image bytes in, png bytes out
+                                      (json for brain_tumor)
+    POST /v1/models/<name> with a json body {"image": base64} gets a json
+    response with the output image base64 encoded under "image"
+    """
+
+    protocol_version = "HTTP/1.1"
+    registry = None
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, obj):
+        self._send(status, json.dumps(obj).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/v1/models":
+            self._send_json(200, self.registry.stats())
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        prefix = "/v1/models/"
+        name = self.path[len(prefix):] if self.path.startswith(prefix) else None
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if name not in self.registry:
+            self._send_json(404, {"error": f"unknown model {name}"})
+            return
+
+        as_json = self.headers.get("Content-Type", "").startswith(
+            "application/json")
+        try:
+            data = base64.b64decode(json.loads(body)["image"]) if as_json else body
+            img = decode_image(data)
+        except Exception as e:
+            self._send_json(400, {"error": f"cannot decode image: {e}"})
+            return
+
+        try:
+            with self.registry.use(name) as service:
+                result = service.infer(img)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+
+        if isinstance(result, dict):
+            self._send_json(200, result)
+        elif as_json:
+            self._send_json(200, {"image": base64.b64encode(
+                encode_png(result)).decode("ascii")})
+        else:
+            self._send(200, encode_png(result), "image/png")
+
+
+def serve(models=MODELS, host="127.0.0.1", port=8000, max_batch_size=8,
+          max_wait_ms=5, memory_budget_mb=None, preload=(), verbose=False):
+    """
+    Hosts models in one process. Each loads on its first request, or at
+    startup when listed in preload, and the least recently used are
+    unloaded when the loaded models exceed memory_budget_mb
+    """
+    enhance_dir = os.path.join(ROOT, "GAN", "photo_enhance")
+    if enhance_dir not in sys.path:
+        sys.path.append(enhance_dir)
+
+    registry = ModelRegistry(
+        lambda name: ModelService(name, max_batch_size=max_batch_size,
+                                  max_wait_ms=max_wait_ms),
+        models, budget_mb=memory_budget_mb)
+    for name in preload:
+        registry.preload([name])
+        stats = registry.stats()["models"][name]
+        print(f"Loaded {name} in {stats['load_s'] + stats['warmup_s']:.1f}s, "
+              f"{stats['resident_mb']:.0f} MB")
+
+    handler = type("Handler", (InferenceHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    print(f"Serving {', '.join(models)} on http://{host}:{port} with a "
+          f"{registry.budget / 2**20:.0f} MB model budget")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        registry.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Local HTTP inference server with dynamic batching and "
+                    "on-demand model loading")
+    parser.add_argument("models", nargs="*",
+                        help=f"any of {', '.join(MODELS)}, all by default")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=5,
+                        help="how long the first request of a batch waits "
+                             "for others to join")
+    parser.add_argument("--memory-budget-mb", type=int,
+                        default=MEMORY_BUDGET_MB,
+                        help="unload the least recently used models above "
+                             "this much resident memory, 0 for no limit")
+    parser.add_argument("--preload", nargs="*", default=[],
+                        help="models to load at startup instead of on their "
+                             "first request")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    for name in args.models + args.preload:
+        if name not in MODELS:
+            parser.error(f"unknown model {name}")
+    models = args.models or MODELS
+    for name in args.preload:
+        if name not in models:
+            parser.error(f"cannot preload {name}, it is not served")
+
+    serve(models, host=args.host, port=args.port,
+          max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+          memory_budget_mb=args.memory_budget_mb, preload=args.preload,
+          verbose=args.verbose)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
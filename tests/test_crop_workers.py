@@ -0,0 +1,33 @@
+import importlib.util
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TUMOR_DIR = os.path.join(ROOT, "CNN", "brain_tumor")
+
+# what a spawned worker does before running a job: re-run the parent's main
+# script as __mp_main__, with the parent's sys.path
+WORKER = """
+import runpy, sys
+sys.path.insert(0, {dir!r})
+runpy.run_path({script!r}, run_name="__mp_main__")
+print("tensorflow" in sys.modules)
+"""
+
+
+@unittest.skipUnless(importlib.util.find_spec("cv2")
+                     and importlib.util.find_spec("imutils"),
+                     "needs opencv and imutils")
+class CropWorkerImportTest(unittest.TestCase):
+    def test_spawned_worker_does_not_import_tensorflow(self):
+        code = WORKER.format(dir=TUMOR_DIR,
+                             script=os.path.join(TUMOR_DIR, "batch.py"))
+        out = subprocess.run([sys.executable, "-c", code], check=True,
+                             capture_output=True, text=True).stdout
+        self.assertEqual(out.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
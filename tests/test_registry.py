@@ -0,0 +1,138 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import numpy as np
+from serving import registry
+from serving.registry import ModelRegistry
+
+MB = 2**20
+
+
+class FakeVariable:
+    """
+    A uint8 variable with the shape and dtype interface of a tf.Variable
+    """
+
+    def __init__(self, nbytes):
+        self.value = np.zeros(nbytes, np.uint8)
+        self.dtype = SimpleNamespace(size=self.value.itemsize)
+        self.shape = SimpleNamespace(num_elements=lambda: self.value.size)
+
+
+class FakeBatcher:
+    def stats(self):
+        return {"batches": 0}
+
+
+class FakeService:
+    def __init__(self, name, size_mb, log):
+        self.name = name
+        self.model = SimpleNamespace(weights=[FakeVariable(size_mb * MB)])
+        self.batcher = FakeBatcher()
+        self.log = log
+        log.append(("load", name))
+
+    def warmup(self):
+        pass
+
+    def stop(self):
+        self.log.append(("stop", self.name))
+
+
+class ModelRegistryTest(unittest.TestCase):
+    def setUp(self):
+        # charge the weight bytes, RSS of the test process is too noisy
+        patcher = mock.patch.object(registry, "resident_bytes", lambda: None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.log = []
+
+    def make(self, budget_mb, sizes=None):
+        sizes = sizes or {"a": 100, "b": 100, "c": 100}
+        return ModelRegistry(
+            lambda name: FakeService(name, sizes[name], self.log),
+            sizes, budget_mb=budget_mb)
+
+    def use(self, reg, *names):
+        for name in names:
+            with reg.use(name) as service:
+                self.assertEqual(service.name, name)
+
+    def test_loads_on_first_use_only(self):
+        reg = self.make(1000)
+        self.assertEqual(self.log, [])
+        self.use(reg, "a", "a", "b")
+        self.assertEqual(self.log, [("load", "a"), ("load", "b")])
+        stats = reg.stats()
+        self.assertEqual(stats["models"]["a"]["loads"], 1)
+        self.assertFalse(stats["models"]["c"]["loaded"])
+        self.assertAlmostEqual(stats["models"]["a"]["resident_mb"], 100)
+        self.assertAlmostEqual(stats["charged_mb"], 200)
+        self.assertIsNotNone(stats["models"]["a"]["load_s"])
+
+    def test_evicts_least_recently_used(self):
+        reg = self.make(250)
+        self.use(reg, "a", "b", "a", "c")
+        # b was used less recently than a when c pushed the total to 300
+        self.assertIn(("stop", "b"), self.log)
+        self.assertNotIn(("stop", "a"), self.log)
+        self.assertEqual(reg.stats()["loaded"], ["a", "c"])
+        self.assertEqual(reg.stats()["models"]["b"]["evictions"], 1)
+
+    def test_makes_room_before_reloading_known_size(self):
+        reg = self.make(250)
+        self.use(reg, "a", "b", "c")
+        self.log.clear()
+        self.use(reg, "a")
+        # a's size is known from its first load, so b goes before a loads
+        self.assertEqual(self.log, [("stop", "b"), ("load", "a")])
+        self.assertEqual(reg.stats()["models"]["a"]["loads"], 2)
+
+    def test_model_in_use_is_not_evicted(self):
+        reg = self.make(150)
+        with reg.use("a"):
+            self.use(reg, "b")
+            self.assertEqual(reg.stats()["models"]["a"]["in_use"], 1)
+            self.assertNotIn(("stop", "a"), self.log)
+            self.assertIn(("stop", "b"), self.log)
+        with reg.use("c"):
+            pass
+        self.assertIn(("stop", "a"), self.log)
+        self.assertEqual(reg.stats()["loaded"], ["c"])
+
+    def test_evicted_service_stops_outside_the_lock(self):
+        reg = self.make(150)
+        locked = []
+        with mock.patch.object(FakeService, "stop",
+                               lambda service: locked.append(reg._lock.locked())):
+            self.use(reg, "a", "b")
+            reg.stop()
+        self.assertEqual(locked, [False, False])
+
+    def test_zero_budget_never_evicts(self):
+        reg = self.make(0)
+        self.use(reg, "a", "b", "c")
+        self.assertEqual(reg.stats()["loaded"], ["a", "b", "c"])
+        self.assertFalse(any(event == "stop" for event, _ in self.log))
+
+    def test_failed_load_leaves_no_user(self):
+        reg = ModelRegistry(lambda name: 1 / 0, ["a"], budget_mb=100)
+        with self.assertRaises(ZeroDivisionError):
+            self.use(reg, "a")
+        stats = reg.stats()["models"]["a"]
+        self.assertFalse(stats["loaded"])
+        self.assertEqual(stats["in_use"], 0)
+
+    def test_stop_unloads_everything(self):
+        reg = self.make(1000)
+        self.use(reg, "a", "b")
+        reg.stop()
+        self.assertEqual(reg.stats()["loaded"], [])
+        self.assertEqual(sorted(self.log[2:]), [("stop", "a"), ("stop", "b")])
+
+
+if __name__ == "__main__":
+    unittest.main()